@@ -0,0 +1,133 @@
+"""
+Chunker - splits extracted text into token-bounded chunks.
+Text is cut into sentences and lines with one regex pass and packed greedily up to
+CHUNK_MAX_TOKENS, starting a new chunk at headings and carrying CHUNK_OVERLAP_TOKENS of
+trailing sentences into the next chunk. Works on offsets into the source text, so nothing
+is copied until a caller asks for a chunk's text.
+"""
+
+import os
+import re
+from collections import deque
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+# Budget per chunk; all-MiniLM-L6-v2 reads 256 word pieces and prompts are packed in tokens
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "400"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+# A heading only starts a new chunk once the current one is at least this full
+_HEADING_MIN_FILL = 0.5
+_HEADING_MAX_TOKENS = 16
+
+# Roughly one BPE token per short word or word piece, number group or punctuation mark
+_TOKEN = re.compile(r"[^\W\d_]{1,8}|\d{1,3}|\S")
+# Paragraph breaks, line breaks, and whitespace after sentence-ending punctuation
+_BOUNDARY = re.compile(r"\n[ \t]*\n\s*|\n\s*|(?<=[^\d\s.][.!?])[\"')\]]*\s+(?=[\"'(\[]?[A-Z0-9])")
+_HEADING = re.compile(r"(?:#{1,6}\s+|\d+(?:\.\d+)*\.?\s+|[A-Z])[^\n]*[^\s.,;:!?]")
+
+
+class Chunk(NamedTuple):
+    text: str
+    start: int
+    end: int
+    tokens: int
+
+
+def count_tokens(text: str, start: int = 0, end: Optional[int] = None) -> int:
+    """Approximate token count of text[start:end] without slicing it."""
+    return sum(1 for _ in _TOKEN.finditer(text, start, len(text) if end is None else end))
+
+
+def _pieces(text: str, start: int, end: int, max_tokens: int) -> Iterator[Tuple[int, int, int]]:
+    """(start, end, tokens) of text[start:end], cut at token boundaries if it exceeds max_tokens."""
+    tokens = 0
+    last_end = start
+    for match in _TOKEN.finditer(text, start, end):
+        if tokens == max_tokens:
+            yield start, last_end, tokens
+            start, tokens = match.start(), 0
+        tokens += 1
+        last_end = match.end()
+    if tokens:
+        yield start, last_end, tokens
+
+
+def _segments(text: str, max_tokens: int) -> Iterator[Tuple[int, int, int, bool]]:
+    """(start, end, tokens, is_heading) for every sentence or line of `text`."""
+    seg_start = len(text) - len(text.lstrip())
+    for match in _BOUNDARY.finditer(text, seg_start):
+        yield from _classify(text, seg_start, match.start(), "\n" in match.group(), max_tokens)
+        seg_start = match.end()
+    if seg_start < len(text):
+        yield from _classify(text, seg_start, len(text), True, max_tokens)
+
+
+def _classify(text: str, start: int, end: int, ends_line: bool, max_tokens: int) -> Iterator[Tuple[int, int, int, bool]]:
+    if start >= end:
+        return
+    pieces = list(_pieces(text, start, end, max_tokens))
+    if len(pieces) == 1:
+        tokens = pieces[0][2]
+        is_heading = (
+            ends_line
+            and tokens <= _HEADING_MAX_TOKENS
+            and (start == 0 or text[start - 1] == "\n")
+            and _HEADING.fullmatch(text, start, end) is not None
+        )
+        yield start, end, tokens, is_heading
+    else:
+        for piece_start, piece_end, tokens in pieces:
+            yield piece_start, piece_end, tokens, False
+
+
+def iter_chunk_spans(
+    text: str,
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS
+) -> Iterator[Tuple[int, int, int]]:
+    """
+    (start, end, tokens) of each chunk of `text`, streamed. Chunks hold whole sentences
+    where possible, never exceed `max_tokens`, and start with up to `overlap_tokens` of the
+    previous chunk's closing sentences (except where a chunk starts at a heading).
+    """
+    current: deque = deque()  # (start, end, tokens) of the segments in the open chunk
+    used = 0
+
+    for start, end, tokens, is_heading in _segments(text, max_tokens):
+        at_heading = is_heading and used >= max_tokens * _HEADING_MIN_FILL
+        if current and (at_heading or used + tokens > max_tokens):
+            yield current[0][0], current[-1][1], used
+            if at_heading:
+                current.clear()
+                used = 0
+            else:
+                # Keep the closing segments that fit the overlap and leave room for this one
+                while current and (used > overlap_tokens or used + tokens > max_tokens):
+                    used -= current.popleft()[2]
+        current.append((start, end, tokens))
+        used += tokens
+
+    if current:
+        yield current[0][0], current[-1][1], used
+
+
+def iter_chunks(
+    text: str,
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS
+) -> Iterator[Chunk]:
+    for start, end, tokens in iter_chunk_spans(text, max_tokens, overlap_tokens):
+        yield Chunk(text[start:end], start, end, tokens)
+
+
+def join_spans(text: str, spans: List[Tuple[int, int]]) -> str:
+    """
+    Join chunk spans of `text` in document order with blank lines, merging spans that
+    overlap or touch so overlapping chunks don't repeat text.
+    """
+    merged: List[List[int]] = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return "\n\n".join(text[start:end] for start, end in merged)
@@ -1,21 +1,191 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+import logging
 import os
+import threading
+
+logger = logging.getLogger(__name__)
 
 # Get database configuration from environment variables
 DATABASE_TYPE = os.getenv("DATABASE_TYPE", "sqlite").lower()
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./question_bank.db")
 
-# Set connect_args based on database type
+# Same database through an asyncio driver, for async endpoints. Without one (other
+# databases, or the driver isn't installed) they run on sync sessions in the threadpool.
+_ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg", "postgres": "postgresql+asyncpg"}
+
+
+def _async_url(url: str) -> Optional[str]:
+    scheme, sep, rest = url.partition("://")
+    driver = _ASYNC_DRIVERS.get(scheme.split("+")[0])
+    return f"{driver}{sep}{rest}" if driver else None
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+
+# SQLite profile
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # safe with WAL; FULL also syncs every commit
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_SINGLE_WRITER = os.getenv("SQLITE_SINGLE_WRITER", "true").lower() == "true"
+
+# Postgres profile
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+_WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+_writer_lock = threading.Lock()
+
+
+def _is_in_memory(url: str) -> bool:
+    return ":memory:" in url or url.endswith(("sqlite://", "sqlite:///"))
+
+
+def _set_sqlite_pragmas(dbapi_connection, in_memory: bool):
+    cursor = dbapi_connection.cursor()
+    if not in_memory:
+        cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def _sqlite_engine():
+    # Transactions start with BEGIN IMMEDIATE (pysqlite opens them lazily, right before the
+    # first write), so a writer takes the database write lock up front instead of failing
+    # to upgrade a read snapshot with SQLITE_BUSY halfway through.
+    engine = create_engine(
+        DATABASE_URL,
+        connect_args={"check_same_thread": False, "isolation_level": "IMMEDIATE"}
+    )
+    in_memory = _is_in_memory(DATABASE_URL)
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        _set_sqlite_pragmas(dbapi_connection, in_memory)
+
+    if SQLITE_SINGLE_WRITER:
+        _install_writer_gate(engine)
+    return engine
+
+
+def _install_writer_gate(engine):
+    """
+    Let one connection at a time hold a write transaction. Writers queue on a Python lock
+    instead of spinning in SQLite's busy handler; the lock is taken at a connection's first
+    write statement and released when its transaction ends. A writer that can't get the
+    lock within the busy timeout goes ahead and leaves the wait to SQLite.
+    """
+    def release(info):
+        if info.pop("holds_writer_lock", False):
+            _writer_lock.release()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def acquire_for_writes(conn, cursor, statement, parameters, context, executemany):
+        if conn.info.get("holds_writer_lock") or not statement.lstrip().upper().startswith(_WRITE_STATEMENTS):
+            return
+        if _writer_lock.acquire(timeout=SQLITE_BUSY_TIMEOUT_MS / 1000):
+            conn.info["holds_writer_lock"] = True
+        else:
+            logger.warning("Timed out waiting for the SQLite writer lock; continuing without it")
+
+    @event.listens_for(engine, "commit")
+    def release_on_commit(conn):
+        release(conn.info)
+
+    @event.listens_for(engine, "rollback")
+    def release_on_rollback(conn):
+        release(conn.info)
+
+    # Connections returned to the pool without commit/rollback (reset-on-return)
+    @event.listens_for(engine, "reset")
+    def release_on_reset(dbapi_connection, connection_record, reset_state):
+        release(connection_record.info)
+
+    @event.listens_for(engine, "close")
+    def release_on_close(dbapi_connection, connection_record):
+        release(connection_record.info)
+
+
+def _postgres_engine():
+    return create_engine(
+        DATABASE_URL,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+        connect_args={"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    )
+
+
+def _async_sqlite_engine():
+    # aiosqlite runs each connection on its own thread, so waiting on a busy database blocks
+    # that thread, never the event loop. The writer gate is left out for the same reason:
+    # its lock would be taken on the loop. Async writers wait in SQLite's busy handler.
+    engine = create_async_engine(ASYNC_DATABASE_URL, connect_args={"isolation_level": "IMMEDIATE"})
+    in_memory = _is_in_memory(ASYNC_DATABASE_URL)
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        _set_sqlite_pragmas(dbapi_connection, in_memory)
+
+    return engine
+
+
+def _async_postgres_engine():
+    return create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+        connect_args={"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+    )
+
+
+# Pick the engine profile based on database type
 if DATABASE_TYPE == "sqlite":
-    connect_args = {"check_same_thread": False}
+    engine = _sqlite_engine()
+elif DATABASE_TYPE in ("postgresql", "postgres"):
+    engine = _postgres_engine()
 else:
-    connect_args = {}
-
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
+    engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def _async_engine():
+    if not ASYNC_DATABASE_URL:
+        return None
+    try:
+        if DATABASE_TYPE == "sqlite":
+            return _async_sqlite_engine()
+        if DATABASE_TYPE in ("postgresql", "postgres"):
+            return _async_postgres_engine()
+        return create_async_engine(ASYNC_DATABASE_URL)
+    except Exception as e:
+        logger.warning(f"No async engine for {DATABASE_TYPE} ({e}); async endpoints will use sync sessions")
+        return None
+
+
+async_engine = _async_engine()
+# Objects stay loaded after commit: an expired attribute can't be lazy-loaded from async code
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+) if async_engine is not None else None
+
 Base = declarative_base()
 
 def get_db():
@@ -24,3 +194,34 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+class ThreadedSession:
+    """
+    Stands in for AsyncSession where there is no async engine: run_sync() runs its function
+    on a sync Session in the threadpool. Async endpoints only use run_sync(), so they work
+    the same on either.
+    """
+
+    def __init__(self):
+        self.sync_session = SessionLocal()
+
+    def _run(self, fn, args, kwargs):
+        try:
+            return fn(self.sync_session, *args, **kwargs)
+        finally:
+            # Hand the connection back between calls: a request holding one while it waits
+            # for a thread could otherwise starve threads waiting on the pool
+            self.sync_session.close()
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(self._run, fn, args, kwargs)
+
+
+async def get_async_db():
+    """AsyncSession on the async engine, or a ThreadedSession when there is none."""
+    if AsyncSessionLocal is None:
+        yield ThreadedSession()
+        return
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,208 @@
+"""
+Embedding Store - content-addressed cache of sentence embeddings.
+Keys are sha256(model name + text), so the same text is only ever encoded once per model.
+Two tiers: an in-process LRU for the hot set and a SQLite file shared by all workers,
+pruned least-recently-used first.
+"""
+
+import os
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+
+import sqlite3
+
+import numpy as np
+
+from backend.core.local_store import LocalStore
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MEMORY_ITEMS = int(os.getenv("EMBEDDING_MEMORY_ITEMS", "20000"))
+EMBEDDING_STORE_PATH = os.getenv("EMBEDDING_STORE_PATH", "./data/embeddings.db")  # empty = memory only
+EMBEDDING_STORE_MAX_ROWS = int(os.getenv("EMBEDDING_STORE_MAX_ROWS", "2000000"))
+
+# SQLite limits bound parameters per statement; stay well below it
+_SQL_BATCH = 500
+# Check the on-disk row cap once per this many writes
+_PRUNE_EVERY = 1000
+# Write read times back to disk (for LRU pruning) once this many keys were read
+_TOUCH_FLUSH = 1000
+
+
+def embedding_key(model_name: str, text: str) -> str:
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore(LocalStore):
+    schema = """
+        CREATE TABLE IF NOT EXISTS embeddings (
+            key TEXT PRIMARY KEY,
+            dim INTEGER NOT NULL,
+            vector BLOB NOT NULL,
+            created_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str = EMBEDDING_STORE_PATH, memory_items: int = EMBEDDING_MEMORY_ITEMS, max_rows: int = EMBEDDING_STORE_MAX_ROWS):
+        super().__init__(Path(path) if path else Path())
+        self.disk_enabled = bool(path)
+        self.memory_items = memory_items
+        self.max_rows = max_rows
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._writes_since_prune = 0
+        self._touched = set()
+        self._counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def _migrate(self, conn: sqlite3.Connection):
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(embeddings)")]
+        if "accessed_at" not in columns:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Another worker may have migrated while we waited for the write lock
+                columns = [row[1] for row in conn.execute("PRAGMA table_info(embeddings)")]
+                if "accessed_at" not in columns:
+                    conn.execute("ALTER TABLE embeddings ADD COLUMN accessed_at REAL NOT NULL DEFAULT 0")
+                    conn.execute("UPDATE embeddings SET accessed_at = created_at")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        conn.execute("DROP INDEX IF EXISTS idx_embeddings_created")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_accessed ON embeddings(accessed_at)")
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Return the vectors found for `keys`; missing keys are simply absent."""
+        found: Dict[str, np.ndarray] = {}
+        pending: List[str] = []
+
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                else:
+                    pending.append(key)
+            self._counts["memory_hits"] += len(found)
+
+            if pending and self.disk_enabled:
+                try:
+                    for start in range(0, len(pending), _SQL_BATCH):
+                        batch = pending[start:start + _SQL_BATCH]
+                        placeholders = ",".join("?" * len(batch))
+                        rows = self.conn.execute(
+                            f"SELECT key, dim, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                        ).fetchall()
+                        for key, dim, blob in rows:
+                            vector = np.frombuffer(blob, dtype=np.float32, count=dim)
+                            found[key] = vector
+                            self._remember(key, vector)
+                            self._counts["disk_hits"] += 1
+                except Exception as e:
+                    logger.warning(f"Embedding store read failed: {e}")
+
+            self._counts["misses"] += sum(1 for key in pending if key not in found)
+
+            if self.disk_enabled:
+                self._touched.update(found)
+                if len(self._touched) >= _TOUCH_FLUSH:
+                    try:
+                        self._flush_touched()
+                    except Exception as e:
+                        logger.warning(f"Embedding store write failed: {e}")
+
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        if not items:
+            return
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, np.asarray(vector, dtype=np.float32))
+
+            if not self.disk_enabled:
+                return
+            try:
+                now = time.time()
+                self.conn.execute("BEGIN IMMEDIATE")
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (key, dim, vector, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (key, len(vector), np.asarray(vector, dtype=np.float32).tobytes(), now, now)
+                        for key, vector in items.items()
+                    ]
+                )
+                self.conn.execute("COMMIT")
+                self._writes_since_prune += len(items)
+                if self._writes_since_prune >= _PRUNE_EVERY:
+                    self._writes_since_prune = 0
+                    self._flush_touched()
+                    self._prune()
+            except Exception as e:
+                logger.warning(f"Embedding store write failed: {e}")
+                if self.conn.in_transaction:
+                    self.conn.execute("ROLLBACK")
+
+    def _touch(self, keys: List[str], now: float):
+        for start in range(0, len(keys), _SQL_BATCH):
+            batch = keys[start:start + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            self.conn.execute(
+                f"UPDATE embeddings SET accessed_at = ? WHERE key IN ({placeholders})", [now, *batch]
+            )
+
+    def _flush_touched(self):
+        """Record the keys read since the last flush as used now."""
+        if not self._touched:
+            return
+        keys = list(self._touched)
+        self._touched.clear()
+        self._transaction(self._touch, keys, time.time())
+
+    def _prune(self):
+        """Drop the least recently used rows once the table exceeds max_rows."""
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_rows
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY accessed_at LIMIT ?)",
+                (excess,)
+            )
+            logger.info(f"Pruned {excess} embeddings from {self.path}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process (the memory tier is per worker)."""
+        with self._lock:
+            counts = dict(self._counts)
+            memory_items = len(self._memory)
+        lookups = sum(counts.values())
+        hits = counts["memory_hits"] + counts["disk_hits"]
+        return {
+            **counts,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_items": memory_items,
+            "max_memory_items": self.memory_items,
+            "max_rows": self.max_rows,
+            "path": str(self.path) if self.disk_enabled else None
+        }
+
+
+_store = None
+
+
+def get_embedding_store() -> EmbeddingStore:
+    global _store
+    if _store is None:
+        _store = EmbeddingStore()
+    return _store
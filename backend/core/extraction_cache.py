@@ -0,0 +1,333 @@
+"""
+Extraction Cache - content-addressed store of parsed uploads.
+Keyed by sha256 of the uploaded file (plus the page selection, if any), each entry holds the normalized text, page and chunk
+boundaries (with chunk token counts), and (once computed) the chunk embeddings, so a repeat upload of the same PDF
+skips PyMuPDF parsing, chunking and embedding. Bounded by a byte budget with LRU eviction.
+"""
+
+import os
+import re
+import time
+import hashlib
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from backend.core.chunker import Chunk, iter_chunk_spans, join_spans
+from backend.core.local_store import LocalStore
+
+logger = logging.getLogger(__name__)
+
+EXTRACTION_CACHE_PATH = os.getenv("EXTRACTION_CACHE_PATH", "./data/extraction_cache.db")
+EXTRACTION_CACHE_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+# Bump whenever extraction, normalization or chunking changes so stale entries are ignored
+EXTRACTION_CACHE_VERSION = 2
+# Longer documents keep only their most topic-relevant chunks for the rest of a request
+MAX_RESIDENT_CONTENT_CHARS = int(os.getenv("MAX_RESIDENT_CONTENT_CHARS", "400000"))
+
+_READ_BLOCK = 1 << 20
+_TRAILING_SPACE = re.compile(r"[ \t\r\f\v]+\n")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+PdfSource = Union[bytes, str, Path]
+
+
+def file_digest(source: PdfSource) -> str:
+    """sha256 of a file's bytes, reading paths in blocks."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(source).hexdigest()
+    digest = hashlib.sha256()
+    with open(source, "rb") as f:
+        for block in iter(lambda: f.read(_READ_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def normalize_page_text(text: str) -> str:
+    """Drop NULs and trailing spaces, and collapse runs of blank lines to one."""
+    text = text.replace("\x00", "")
+    text = _TRAILING_SPACE.sub("\n", text)
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+def _pack_spans(spans: Iterable[Tuple[int, ...]], width: int = 2) -> bytes:
+    return np.asarray(list(spans), dtype=np.int64).reshape(-1, width).tobytes()
+
+
+def _unpack_spans(blob: bytes, width: int = 2) -> List[Tuple[int, ...]]:
+    return [tuple(span) for span in np.frombuffer(blob, dtype=np.int64).reshape(-1, width).tolist()]
+
+
+class ExtractedDocument:
+    """
+    Normalized text of an upload plus its page boundaries and chunks, as offsets into `text`
+    ((start, end) per page, (start, end, tokens) per chunk).
+    """
+
+    def __init__(
+        self,
+        digest: str,
+        text: str,
+        pages: List[Tuple[int, int]],
+        chunks: List[Tuple[int, int, int]],
+        embeddings: Optional[np.ndarray] = None,
+        embedding_model: Optional[str] = None
+    ):
+        self.digest = digest
+        self.text = text
+        self.pages = pages
+        self.chunks = chunks
+        self.embeddings = embeddings
+        self.embedding_model = embedding_model
+
+    @property
+    def page_count(self) -> int:
+        return len(self.pages)
+
+    def chunk_texts(self) -> List[str]:
+        return [self.text[start:end] for start, end, _ in self.chunks]
+
+    def iter_chunks(self) -> Iterator[Chunk]:
+        for start, end, tokens in self.chunks:
+            yield Chunk(self.text[start:end], start, end, tokens)
+
+
+class ExtractionCache(LocalStore):
+    schema = """
+        CREATE TABLE IF NOT EXISTS documents (
+            digest TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            pages BLOB NOT NULL,
+            chunks BLOB NOT NULL,
+            embedding_model TEXT,
+            embeddings BLOB,
+            dim INTEGER,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            accessed_at REAL NOT NULL,
+            PRIMARY KEY (digest, version)
+        );
+        CREATE INDEX IF NOT EXISTS idx_documents_accessed ON documents(accessed_at);
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, path: str = EXTRACTION_CACHE_PATH, max_bytes: int = EXTRACTION_CACHE_MAX_BYTES):
+        super().__init__(Path(path))
+        self.max_bytes = max_bytes
+
+    def get(self, digest: str) -> Optional[ExtractedDocument]:
+        def lookup():
+            row = self.conn.execute(
+                "SELECT text, pages, chunks, embedding_model, embeddings, dim FROM documents "
+                "WHERE digest = ? AND version = ?",
+                (digest, EXTRACTION_CACHE_VERSION)
+            ).fetchone()
+            if row is None:
+                self._bump("misses")
+                return None
+            self.conn.execute(
+                "UPDATE documents SET accessed_at = ? WHERE digest = ? AND version = ?",
+                (time.time(), digest, EXTRACTION_CACHE_VERSION)
+            )
+            self._bump("hits")
+            return row
+
+        row = self._transaction(lookup)
+        if row is None:
+            return None
+        text, pages, chunks, embedding_model, embeddings, dim = row
+        matrix = np.frombuffer(embeddings, dtype=np.float32).reshape(-1, dim) if embeddings is not None else None
+        return ExtractedDocument(digest, text, _unpack_spans(pages), _unpack_spans(chunks, 3), matrix, embedding_model)
+
+    def put(self, document: ExtractedDocument):
+        pages = _pack_spans(document.pages)
+        chunks = _pack_spans(document.chunks, 3)
+        size = len(document.text.encode("utf-8")) + len(pages) + len(chunks)
+
+        def store():
+            now = time.time()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO documents "
+                "(digest, version, text, pages, chunks, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (document.digest, EXTRACTION_CACHE_VERSION, document.text, pages, chunks, size, now, now)
+            )
+            self._bump("stores")
+            self._evict()
+
+        self._transaction(store)
+
+    def put_embeddings(self, digest: str, model_name: str, embeddings: np.ndarray):
+        matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+
+        def store():
+            # Replaced embeddings (another model) stop counting towards the entry's size
+            self.conn.execute(
+                "UPDATE documents SET size = size - COALESCE(LENGTH(embeddings), 0) + ?, "
+                "embedding_model = ?, embeddings = ?, dim = ? WHERE digest = ? AND version = ?",
+                (matrix.nbytes, model_name, matrix.tobytes(), matrix.shape[1], digest, EXTRACTION_CACHE_VERSION)
+            )
+            self._evict()
+
+        self._transaction(store)
+
+    def _evict(self):
+        """Drop old-version entries, then least-recently-used ones until under the byte budget."""
+        self.conn.execute("DELETE FROM documents WHERE version != ?", (EXTRACTION_CACHE_VERSION,))
+        (total,) = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM documents").fetchone()
+        if total <= self.max_bytes:
+            return
+
+        victims = []
+        for digest, version, size in self.conn.execute(
+            "SELECT digest, version, size FROM documents ORDER BY accessed_at"
+        ):
+            if total <= self.max_bytes:
+                break
+            victims.append((digest, version))
+            total -= size
+        self.conn.executemany("DELETE FROM documents WHERE digest = ? AND version = ?", victims)
+        self._bump("evictions", len(victims))
+
+    def clear(self) -> int:
+        return self._transaction(lambda: self.conn.execute("DELETE FROM documents").rowcount)
+
+    def stats(self) -> Dict[str, Any]:
+        values = self._counters()
+        with self._lock:
+            entries, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM documents").fetchone()
+        hits, misses = values.get("hits", 0), values.get("misses", 0)
+        return {
+            "entries": entries,
+            "bytes": total,
+            "hits": hits,
+            "misses": misses,
+            "stores": values.get("stores", 0),
+            "evictions": values.get("evictions", 0),
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "max_bytes": self.max_bytes,
+            "path": str(self.path)
+        }
+
+
+_cache = None
+
+
+def get_extraction_cache() -> ExtractionCache:
+    global _cache
+    if _cache is None:
+        _cache = ExtractionCache()
+    return _cache
+
+
+def _assemble(digest: str, page_texts: Iterable[str]) -> ExtractedDocument:
+    parts: List[str] = []
+    pages: List[Tuple[int, int]] = []
+    offset = 0
+    for page_text in page_texts:
+        text = normalize_page_text(page_text)
+        if parts:
+            parts.append("\n\n")
+            offset += 2
+        parts.append(text)
+        pages.append((offset, offset + len(text)))
+        offset += len(text)
+
+    text = "".join(parts)
+    return ExtractedDocument(digest, text, pages, list(iter_chunk_spans(text)))
+
+
+def selection_key(digest: str, pages: Sequence[int]) -> str:
+    """Cache key for a page selection of the file with `digest`."""
+    return f"{digest}:{hashlib.sha256(','.join(map(str, pages)).encode()).hexdigest()}"
+
+
+def extract_document(source: PdfSource, digest: Optional[str] = None, pages: Optional[Sequence[int]] = None) -> ExtractedDocument:
+    """
+    Parse a PDF (bytes or path), or return the cached result for identical bytes.
+    Pass `digest` when the caller already hashed the file, and `pages` (0-based) to
+    extract only those pages. A selection is sliced from the cached full document when
+    there is one; otherwise only the selected pages are parsed.
+    """
+    from backend.core.pdf_processor import iter_pdf_pages
+
+    digest = digest or file_digest(source)
+    pages = sorted(set(pages)) if pages is not None else None
+    key = digest if pages is None else selection_key(digest, pages)
+    cache = get_extraction_cache()
+
+    try:
+        document = cache.get(key)
+        if document is not None:
+            logger.info(f"Extraction cache hit for {key[:12]} ({document.page_count} pages)")
+            return document
+        full = cache.get(digest) if pages is not None else None
+    except Exception as e:
+        logger.warning(f"Extraction cache read failed: {e}")
+        full = None
+
+    if full is not None and pages[-1] < full.page_count:
+        logger.info(f"Slicing {len(pages)}/{full.page_count} pages from cached document {digest[:12]}")
+        document = _assemble(key, (full.text[start:end] for start, end in (full.pages[n] for n in pages)))
+    else:
+        document = _assemble(key, (page.text for page in iter_pdf_pages(source, pages=pages)))
+
+    try:
+        cache.put(document)
+    except Exception as e:
+        logger.warning(f"Extraction cache write failed: {e}")
+    return document
+
+
+def document_chunk_embeddings(document: ExtractedDocument) -> Optional[np.ndarray]:
+    """Chunk embeddings for `document`, computed once per file and embedding model."""
+    from backend.core.local_ml import EMBEDDING_MODEL, encode_texts
+
+    if document.embeddings is not None and document.embedding_model == EMBEDDING_MODEL:
+        return document.embeddings
+
+    embeddings = encode_texts(document.chunk_texts())
+    if embeddings is None:
+        return None
+    document.embeddings, document.embedding_model = embeddings, EMBEDDING_MODEL
+    try:
+        get_extraction_cache().put_embeddings(document.digest, EMBEDDING_MODEL, embeddings)
+    except Exception as e:
+        logger.warning(f"Extraction cache write failed: {e}")
+    return embeddings
+
+
+def select_relevant_text(document: ExtractedDocument, topic: str, max_chars: int = MAX_RESIDENT_CONTENT_CHARS) -> str:
+    """
+    The document text if it fits in `max_chars`; otherwise the chunks most similar to
+    `topic` (document order without the embedding model) that fit, rejoined in document order.
+    """
+    if len(document.text) <= max_chars:
+        return document.text
+
+    order = range(len(document.chunks))
+    embeddings = document_chunk_embeddings(document)
+    if embeddings is not None:
+        from backend.core.local_ml import encode_texts
+        from backend.core.vector_index import normalize
+
+        query = normalize(encode_texts([topic]))[0]
+        order = np.argsort(-(normalize(embeddings) @ query), kind="stable")
+
+    selected = []
+    total = 0
+    for index in order:
+        start, end, _ = document.chunks[index]
+        if total + (end - start) > max_chars:
+            continue
+        selected.append((start, end))
+        total += end - start + 2
+
+    logger.info(f"Keeping {len(selected)}/{len(document.chunks)} chunks ({total} of {len(document.text)} chars) for topic '{topic}'")
+    return join_spans(document.text, selected)
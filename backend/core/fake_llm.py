@@ -0,0 +1,245 @@
+"""
+Fake LLM Backend - deterministic, offline stand-in for Gemini.
+Selected with LLM_BACKEND=fake. Produces schema-valid responses for the prompts the
+generator and validator send, with configurable latency, token rate, streaming chunk
+size and failure rate, so the rest of the pipeline can be load-tested without a key.
+"""
+
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+FAKE_LLM_TOKENS_PER_SEC = float(os.getenv("FAKE_LLM_TOKENS_PER_SEC", "0"))  # 0 = no throttling
+FAKE_LLM_CHUNK_CHARS = int(os.getenv("FAKE_LLM_CHUNK_CHARS", "64"))
+FAKE_LLM_FAILURE_RATE = float(os.getenv("FAKE_LLM_FAILURE_RATE", "0"))
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
+
+# Rough chars-per-token ratio used to turn the token rate into delays
+_CHARS_PER_TOKEN = 4
+
+_WORDS = [
+    "energy", "cell", "process", "system", "structure", "function", "reaction", "force",
+    "theory", "model", "value", "network", "signal", "pressure", "layer", "cycle",
+    "pattern", "source", "element", "balance", "factor", "method", "result", "rate",
+    "change", "limit", "state", "phase", "surface", "field", "unit", "sequence"
+]
+
+
+class FakeLLMError(RuntimeError):
+    """Raised for injected failures (FAKE_LLM_FAILURE_RATE)."""
+
+
+class FakeResponse:
+    """Mimics the SDK response object; the app only reads `.text`."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+def _prompt_rng(prompt: str, seed: int) -> random.Random:
+    digest = hashlib.sha256(f"{seed}:{prompt}".encode("utf-8")).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+def _extract_topic(prompt: str) -> str:
+    match = re.search(r'Topic: (.+)', prompt) or re.search(r'on the topic: "(.+?)"', prompt)
+    return match.group(1).strip() if match else "general knowledge"
+
+
+def _extract_count(prompt: str) -> Optional[int]:
+    match = re.search(r'EXACTLY (\d+) questions', prompt)
+    return int(match.group(1)) if match else None
+
+
+def _extract_json_array(prompt: str) -> Optional[List[Any]]:
+    """Find the first JSON array embedded in the prompt (validator correction prompts)."""
+    decoder = json.JSONDecoder()
+    for match in re.finditer(r'^[ \t]*\[', prompt, re.MULTILINE):
+        try:
+            value, _ = decoder.raw_decode(prompt, match.end() - 1)
+        except ValueError:
+            continue
+        if isinstance(value, list):
+            return value
+    return None
+
+
+def _fake_sentence(rng: random.Random, topic: str, n_words: int) -> str:
+    words = [rng.choice(_WORDS) for _ in range(n_words)]
+    return f"{topic}: " + " ".join(words)
+
+
+def _schema_type(schema: Dict[str, Any]) -> str:
+    kind = schema.get("type", "STRING")
+    # SDK Type enums stringify as "Type.ARRAY"; use their value instead
+    return str(getattr(kind, "value", kind)).upper()
+
+
+def _fake_value(schema: Dict[str, Any], rng: random.Random, topic: str, name: str = "", count: Optional[int] = None) -> Any:
+    """Build a value matching a Gemini-style (OBJECT/ARRAY/STRING/...) schema dict."""
+    kind = _schema_type(schema)
+
+    if kind == "OBJECT":
+        obj = {
+            prop: _fake_value(sub_schema, rng, topic, prop)
+            for prop, sub_schema in schema.get("properties", {}).items()
+        }
+        # Keep question objects internally consistent so local validation passes
+        if isinstance(obj.get("options"), list) and obj["options"] and "answer" in obj:
+            obj["answer"] = rng.choice(obj["options"])
+        return obj
+
+    if kind == "ARRAY":
+        items = schema.get("items", {"type": "STRING"})
+        if count is None:
+            count = 4 if name == "options" else rng.randint(3, 5)
+        return [_fake_value(items, rng, topic, name) for _ in range(count)]
+
+    if kind in ("INTEGER", "NUMBER"):
+        return rng.randint(0, 100)
+
+    if kind == "BOOLEAN":
+        return rng.random() < 0.5
+
+    if name == "description":
+        return _fake_sentence(rng, topic, 12) + "?"
+    if name == "options":
+        return " ".join(rng.choice(_WORDS) for _ in range(3))
+    return _fake_sentence(rng, topic, 16) + "."
+
+
+class FakeModelWrapper:
+    """
+    Drop-in replacement for llm.ModelWrapper.
+    Output depends only on the prompt and seed; injected failures follow a seeded
+    per-process sequence so a run is reproducible for a given call order.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "fake-llm",
+        latency_ms: float = FAKE_LLM_LATENCY_MS,
+        tokens_per_sec: float = FAKE_LLM_TOKENS_PER_SEC,
+        chunk_chars: int = FAKE_LLM_CHUNK_CHARS,
+        failure_rate: float = FAKE_LLM_FAILURE_RATE,
+        seed: int = FAKE_LLM_SEED
+    ):
+        self.model_name = model_name
+        self.latency_ms = latency_ms
+        self.tokens_per_sec = tokens_per_sec
+        self.chunk_chars = max(1, chunk_chars)
+        self.failure_rate = failure_rate
+        self.seed = seed
+        self._failure_rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    # --- Response construction ---
+
+    def _render(self, prompt: str, generation_config=None) -> str:
+        rng = _prompt_rng(prompt, self.seed)
+        topic = _extract_topic(prompt)
+        schema = getattr(generation_config, "response_schema", None) if generation_config else None
+
+        if schema is None:
+            # Free-form text, e.g. the validator's report
+            n_questions = max(1, prompt.count('"description"'))
+            lines = [
+                f"Question {i + 1}: relevance OK, answer correct, clear wording. Recommendation: KEEP."
+                for i in range(n_questions)
+            ]
+            return "\n".join(lines) + "\n"
+
+        if not isinstance(schema, dict):
+            # SDK Schema objects: normalise to the dict form we declared them with
+            schema = schema.model_dump(exclude_none=True) if hasattr(schema, "model_dump") else {}
+
+        if _schema_type(schema) == "ARRAY":
+            # Correction prompts carry the questions to keep; echo them back unchanged
+            count = _extract_count(prompt)
+            if count is None:
+                existing = _extract_json_array(prompt)
+                if existing is not None:
+                    return json.dumps(existing)
+                count = 5
+            return json.dumps(_fake_value(schema, rng, topic, count=count))
+
+        return json.dumps(_fake_value(schema, rng, topic))
+
+    def _maybe_fail(self):
+        if self.failure_rate <= 0:
+            return
+        with self._lock:
+            roll = self._failure_rng.random()
+        if roll < self.failure_rate:
+            raise FakeLLMError("Injected fake LLM failure")
+
+    def _chunk_delay(self, text: str) -> float:
+        if self.tokens_per_sec <= 0:
+            return 0.0
+        return (len(text) / _CHARS_PER_TOKEN) / self.tokens_per_sec
+
+    def _chunks(self, text: str) -> Iterator[str]:
+        for start in range(0, len(text), self.chunk_chars):
+            yield text[start:start + self.chunk_chars]
+
+    # --- Sync API (same signature as ModelWrapper.generate_content) ---
+    # Calls take slots from the real backend's limiter, so load tests see the same caps
+
+    def generate_content(self, prompt, generation_config=None, stream=False, use_web_search=False, user_id=None):
+        from backend.core.llm import limiter
+
+        if stream:
+            return self._stream(prompt, generation_config, user_id)
+
+        with limiter.hold(user_id):
+            self._maybe_fail()
+            text = self._render(prompt, generation_config)
+            time.sleep(self.latency_ms / 1000 + self._chunk_delay(text))
+            return FakeResponse(text)
+
+    def _stream(self, prompt, generation_config, user_id) -> Iterator[FakeResponse]:
+        from backend.core.llm import limiter
+
+        with limiter.hold(user_id):
+            self._maybe_fail()
+            text = self._render(prompt, generation_config)
+            time.sleep(self.latency_ms / 1000)
+            for chunk in self._chunks(text):
+                delay = self._chunk_delay(chunk)
+                if delay:
+                    time.sleep(delay)
+                yield FakeResponse(chunk)
+
+    # --- Async API (same signatures as ModelWrapper.agenerate_*) ---
+
+    async def agenerate_content(self, prompt, generation_config=None, use_web_search=False, user_id=None):
+        from backend.core.llm import limiter
+
+        async with limiter.slot(user_id):
+            self._maybe_fail()
+            text = self._render(prompt, generation_config)
+            await asyncio.sleep(self.latency_ms / 1000 + self._chunk_delay(text))
+            return FakeResponse(text)
+
+    async def agenerate_content_stream(self, prompt, generation_config=None, user_id=None):
+        from backend.core.llm import limiter
+
+        async with limiter.slot(user_id):
+            self._maybe_fail()
+            text = self._render(prompt, generation_config)
+            await asyncio.sleep(self.latency_ms / 1000)
+            for chunk in self._chunks(text):
+                delay = self._chunk_delay(chunk)
+                if delay:
+                    await asyncio.sleep(delay)
+                yield FakeResponse(chunk)
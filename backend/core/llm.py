@@ -1,5 +1,9 @@
 import os
+import asyncio
 import logging
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from google import genai
 from google.genai import types
 from dotenv import load_dotenv
@@ -16,15 +20,22 @@ load_dotenv(env_path)
 
 API_KEY = os.getenv("GEMINI_API_KEY")
 
-if not API_KEY:
+# "gemini" (default) or "fake" for the deterministic offline backend in fake_llm.py
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").lower()
+
+if not API_KEY and LLM_BACKEND != "fake":
     logger.warning("GEMINI_API_KEY environment variable not set. LLM features may fail.")
 
-# Initialize the client
-client = genai.Client(api_key=API_KEY)
+# Initialize the client (the fake backend never talks to the network)
+client = genai.Client(api_key=API_KEY) if LLM_BACKEND != "fake" else None
 
 # --- Model Configuration ---
 MODEL_NAME = "gemini-flash-latest"
 
+# Process-wide cap on concurrent LLM calls, and the share a single user may hold
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_PER_USER_CONCURRENCY = int(os.getenv("LLM_PER_USER_CONCURRENCY", "4"))
+
 # --- Schemas ---
 # The new SDK allows defining schemas using dictionaries, similar to the old one,
 # but passing them is slightly different in the config.
@@ -50,6 +61,97 @@ questions_schema = {
     "items": question_schema
 }
 
+# --- Concurrency Limits ---
+
+class ConcurrencyLimiter:
+    """
+    Caps how many LLM calls are in flight from this process.
+    A process-wide limit bounds the total, and a per-user limit stops a single user
+    (e.g. one large multi-set session) from taking every slot.
+    Worker threads take slots with hold(), coroutines with slot(); both draw on the same
+    counts, so the caps hold however a call is made. A slot is only taken when both the
+    user's share and the process-wide total have room.
+    """
+
+    def __init__(self, max_concurrency: int, per_user_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self.per_user_concurrency = per_user_concurrency
+        self._changed = threading.Condition()
+        self._in_flight = 0
+        # In-flight calls per user; users drop out at zero so the map doesn't grow with every user ever seen
+        self._per_user: Dict[Any, int] = {}
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def _try_acquire(self, user_id) -> bool:
+        # Caller holds self._changed
+        if self._in_flight >= self.max_concurrency:
+            return False
+        if user_id is not None and self._per_user.get(user_id, 0) >= self.per_user_concurrency:
+            return False
+        self._in_flight += 1
+        if user_id is not None:
+            self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+        return True
+
+    def _release(self, user_id):
+        with self._changed:
+            self._in_flight -= 1
+            if user_id is not None:
+                remaining = self._per_user[user_id] - 1
+                if remaining:
+                    self._per_user[user_id] = remaining
+                else:
+                    del self._per_user[user_id]
+            self._changed.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    @contextmanager
+    def hold(self, user_id=None):
+        """Blocks the calling thread until a slot is free."""
+        with self._changed:
+            while not self._try_acquire(user_id):
+                self._changed.wait()
+        try:
+            yield
+        finally:
+            self._release(user_id)
+
+    @asynccontextmanager
+    async def slot(self, user_id=None):
+        """Waits for a slot without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._changed:
+                if self._try_acquire(user_id):
+                    break
+                future = loop.create_future()
+                self._async_waiters.append((loop, future))
+            await future
+        try:
+            yield
+        finally:
+            self._release(user_id)
+
+    def stats(self) -> Dict[str, int]:
+        with self._changed:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "per_user_concurrency": self.per_user_concurrency,
+                "in_flight": self._in_flight,
+                "active_users": len(self._per_user)
+            }
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+limiter = ConcurrencyLimiter(LLM_MAX_CONCURRENCY, LLM_PER_USER_CONCURRENCY)
+
+
 # --- Wrapper Class for Compatibility ---
 # The rest of the app expects a 'model' object with a 'generate_content' method.
 # We'll create a wrapper to adapt the new 'client' to the old interface the app uses.
@@ -59,17 +161,13 @@ class ModelWrapper:
         self.client = client
         self.model_name = model_name
 
-    def generate_content(self, prompt, generation_config=None, stream=False, use_web_search=False):
+    def _build_config(self, generation_config=None, stream=False, use_web_search=False):
         """
-        Wraps the new client.models.generate_content to look like the old model.generate_content
-        Supports both streaming and non-streaming responses.
-        Supports grounding with Google Search when use_web_search=True.
-        Note: Web search grounding may not work with streaming in current API version.
+        Adapts the old 'generation_config' object (which was likely a GenerationConfig object)
+        to the new SDK's 'config' dictionary.
         """
         config = {}
         
-        # Adapt the old 'generation_config' object (which was likely a GenerationConfig object)
-        # to the new SDK's 'config' dictionary or types.GenerateContentConfig.
         if generation_config:
             # Check if it has a response_schema
             if hasattr(generation_config, 'response_schema'):
@@ -81,35 +179,97 @@ class ModelWrapper:
         
         # Add grounding with Google Search if requested
         # Note: Some API versions may not support tools with streaming
-        tools = None
         if use_web_search and not stream:
             # Only use tools with non-streaming for compatibility
-            tools = [types.Tool(google_search=types.GoogleSearch())]
+            config['tools'] = [types.Tool(google_search=types.GoogleSearch())]
 
-        try:
-            if stream:
-                # Use generate_content_stream for streaming responses
-                # Don't pass tools to streaming - not supported in current API
-                response = self.client.models.generate_content_stream(
+        return config
+
+    def generate_content(self, prompt, generation_config=None, stream=False, use_web_search=False, user_id=None):
+        """
+        Wraps the new client.models.generate_content to look like the old model.generate_content
+        Supports both streaming and non-streaming responses.
+        Supports grounding with Google Search when use_web_search=True.
+        Note: Web search grounding may not work with streaming in current API version.
+        Blocks until the shared limiter has a slot for `user_id`; a stream holds its slot
+        until it is exhausted or closed, and only starts once it is iterated.
+        """
+        config = self._build_config(generation_config, stream, use_web_search)
+
+        if stream:
+            # Use generate_content_stream for streaming responses
+            # Don't pass tools to streaming - not supported in current API
+            return self._stream(prompt, config, user_id)
+
+        with limiter.hold(user_id):
+            try:
+                # Use regular generate_content for non-streaming
+                return self.client.models.generate_content(
                     model=self.model_name,
                     contents=prompt,
                     config=config
                 )
-            else:
-                # Use regular generate_content for non-streaming
-                response = self.client.models.generate_content(
+            except Exception as e:
+                logger.error(f"Error in generate_content: {e}")
+                raise e
+
+    def _stream(self, prompt, config, user_id) -> Iterator[Any]:
+        with limiter.hold(user_id):
+            try:
+                yield from self.client.models.generate_content_stream(
+                    model=self.model_name,
+                    contents=prompt,
+                    config=config
+                )
+            except Exception as e:
+                logger.error(f"Error in generate_content: {e}")
+                raise e
+
+    async def agenerate_content(self, prompt, generation_config=None, use_web_search=False, user_id=None):
+        """
+        Async counterpart of generate_content (non-streaming) using the SDK's async client.
+        Waits for a slot from the shared limiter, so it never blocks the event loop.
+        """
+        config = self._build_config(generation_config, False, use_web_search)
+
+        async with limiter.slot(user_id):
+            try:
+                return await self.client.aio.models.generate_content(
                     model=self.model_name,
                     contents=prompt,
-                    config=config,
-                    tools=tools
+                    config=config
+                )
+            except Exception as e:
+                logger.error(f"Error in agenerate_content: {e}")
+                raise e
+
+    async def agenerate_content_stream(self, prompt, generation_config=None, user_id=None):
+        """
+        Async streaming counterpart of generate_content(stream=True).
+        Yields response chunks; the limiter slot is held until the stream is exhausted or closed.
+        """
+        config = self._build_config(generation_config, True)
+
+        async with limiter.slot(user_id):
+            try:
+                response = await self.client.aio.models.generate_content_stream(
+                    model=self.model_name,
+                    contents=prompt,
+                    config=config
                 )
-            return response
-        except Exception as e:
-            logger.error(f"Error in generate_content: {e}")
-            raise e
+                async for chunk in response:
+                    yield chunk
+            except Exception as e:
+                logger.error(f"Error in agenerate_content_stream: {e}")
+                raise e
 
 # Create the global model instance
-model = ModelWrapper(client, MODEL_NAME)
+if LLM_BACKEND == "fake":
+    from backend.core.fake_llm import FakeModelWrapper
+    logger.info("Using fake LLM backend (LLM_BACKEND=fake)")
+    model = FakeModelWrapper()
+else:
+    model = ModelWrapper(client, MODEL_NAME)
 
 
 # --- Utilities ---
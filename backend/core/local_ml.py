@@ -4,17 +4,24 @@ Uses sentence-transformers for semantic similarity, duplicate detection, and cac
 """
 
 import os
-import json
-import hashlib
 import logging
+import threading
 from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
 
+from backend.core.chunker import CHUNK_MAX_TOKENS, iter_chunks
+from backend.core.vector_index import QuestionIndex
+from backend.core.question_cache import QuestionCache, get_question_cache, make_cache_key
+
 logger = logging.getLogger(__name__)
 
 # Lazy loading to avoid import overhead if not used
 _model = None
-_cache_dir = Path("./data/embeddings_cache")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+_legacy_cache_dir = Path("./data/embeddings_cache")  # pre-SQLite JSON cache, imported once
+
+# Rows per tile when computing pairwise similarities (tile memory is block_size^2 floats)
+DUPLICATE_BLOCK_SIZE = int(os.getenv("DUPLICATE_BLOCK_SIZE", "1024"))
 
 
 def get_model():
@@ -24,9 +31,8 @@ def get_model():
         try:
             from sentence_transformers import SentenceTransformer
             # Use a lightweight model (only ~80MB) - good balance of speed/quality
-            model_name = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
-            logger.info(f"Loading embedding model: {model_name}")
-            _model = SentenceTransformer(model_name)
+            logger.info(f"Loading embedding model: {EMBEDDING_MODEL}")
+            _model = SentenceTransformer(EMBEDDING_MODEL)
             logger.info("Embedding model loaded successfully")
         except ImportError:
             logger.warning("sentence-transformers not installed. Local ML features disabled.")
@@ -37,13 +43,46 @@ def get_model():
     return _model
 
 
+def encode_texts(texts: List[str]):
+    """
+    Embed a list of texts, returning a (len(texts), dim) numpy array (None if the model is unavailable).
+    Looks each text up in the embedding store first and runs the model once, on the
+    unique misses only; new vectors are written back to the store.
+    """
+    model = get_model()
+    if model is None:
+        return None
+
+    import numpy as np
+    from backend.core.embedding_store import get_embedding_store, embedding_key
+
+    store = get_embedding_store()
+    keys = [embedding_key(EMBEDDING_MODEL, text) for text in texts]
+    found = store.get_many(set(keys))
+
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in found and key not in missing:
+            missing[key] = text
+
+    if missing:
+        encoded = model.encode(list(missing.values()), convert_to_numpy=True)
+        new_vectors = dict(zip(missing.keys(), np.asarray(encoded, dtype=np.float32)))
+        store.put_many(new_vectors)
+        found.update(new_vectors)
+
+    if not keys:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.stack([found[key] for key in keys])
+
+
 def compute_embedding(text: str) -> Optional[List[float]]:
     """Compute embedding vector for a text string."""
     model = get_model()
     if model is None:
         return None
     try:
-        embedding = model.encode(text, convert_to_numpy=True)
+        embedding = encode_texts([text])[0]
         return embedding.tolist()
     except Exception as e:
         logger.error(f"Error computing embedding: {e}")
@@ -59,7 +98,7 @@ def compute_similarity(text1: str, text2: str) -> float:
     if model is None:
         return 0.0
     try:
-        embeddings = model.encode([text1, text2], convert_to_numpy=True)
+        embeddings = encode_texts([text1, text2])
         # Cosine similarity
         from numpy import dot
         from numpy.linalg import norm
@@ -70,6 +109,54 @@ def compute_similarity(text1: str, text2: str) -> float:
         return 0.0
 
 
+def _normalize_rows(embeddings):
+    """L2-normalize rows as float32; all-zero rows stay zero (similarity 0 to everything)."""
+    import numpy as np
+
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def find_duplicate_pairs(embeddings, threshold: float = 0.85, block_size: int = DUPLICATE_BLOCK_SIZE) -> List[Tuple[int, int, float]]:
+    """
+    Find all pairs (i, j), i < j, whose cosine similarity is >= threshold.
+    Rows are normalized once, then the upper triangle of the similarity matrix is computed
+    one (block_size x block_size) tile at a time, so memory stays bounded for large corpora.
+    Pairs are returned in (i, j) order.
+    """
+    import numpy as np
+
+    matrix = _normalize_rows(embeddings)
+    n = len(matrix)
+    pairs: List[Tuple[int, int, float]] = []
+
+    for row_start in range(0, n, block_size):
+        row_end = min(row_start + block_size, n)
+        row_block = matrix[row_start:row_end]
+        block_hits = []
+
+        for col_start in range(row_start, n, block_size):
+            col_end = min(col_start + block_size, n)
+            scores = row_block @ matrix[col_start:col_end].T
+            if col_start == row_start:
+                # Diagonal tile: keep only j > i
+                scores[np.tril_indices(len(scores), m=scores.shape[1])] = -np.inf
+            rows, cols = np.nonzero(scores >= threshold)
+            if len(rows):
+                block_hits.append((rows + row_start, cols + col_start, scores[rows, cols]))
+
+        if block_hits:
+            rows = np.concatenate([h[0] for h in block_hits])
+            cols = np.concatenate([h[1] for h in block_hits])
+            vals = np.concatenate([h[2] for h in block_hits])
+            order = np.lexsort((cols, rows))
+            pairs.extend(zip(rows[order].tolist(), cols[order].tolist(), vals[order].astype(float).tolist()))
+
+    return pairs
+
+
 def find_duplicates(questions: List[Dict[str, Any]], threshold: float = 0.85) -> List[Tuple[int, int, float]]:
     """
     Find duplicate/similar questions in a list.
@@ -82,19 +169,9 @@ def find_duplicates(questions: List[Dict[str, Any]], threshold: float = 0.85) ->
     try:
         # Extract question descriptions
         descriptions = [q.get("description", "") for q in questions]
-        embeddings = model.encode(descriptions, convert_to_numpy=True)
-        
-        duplicates = []
-        from numpy import dot
-        from numpy.linalg import norm
-        
-        for i in range(len(embeddings)):
-            for j in range(i + 1, len(embeddings)):
-                similarity = dot(embeddings[i], embeddings[j]) / (norm(embeddings[i]) * norm(embeddings[j]))
-                if similarity >= threshold:
-                    duplicates.append((i, j, float(similarity)))
+        embeddings = encode_texts(descriptions)
         
-        return duplicates
+        return find_duplicate_pairs(embeddings, threshold)
     except Exception as e:
         logger.error(f"Error finding duplicates: {e}")
         return []
@@ -120,41 +197,74 @@ def remove_duplicate_questions(questions: List[Dict[str, Any]], threshold: float
 
 # ============ Question Caching System ============
 
-def _get_cache_key(topic: str, content: str, difficulty: str, question_type: str) -> str:
-    """Generate a cache key based on generation parameters."""
-    cache_input = f"{topic}:{difficulty}:{question_type}:{content[:500] if content else ''}"
-    return hashlib.sha256(cache_input.encode()).hexdigest()[:16]
+# Similarity index over every cached question (see vector_index.QuestionIndex),
+# kept in step with the question cache via its write sequence and removal log
+_question_index = QuestionIndex()
+_indexed_entries: Dict[str, List[int]] = {}  # cache key -> index ids
+_indexed_seq = 0
+_indexed_removal_seq = 0
+_index_lock = threading.RLock()
+_legacy_checked = False
 
 
-def _ensure_cache_dir():
-    """Ensure cache directory exists."""
-    _cache_dir.mkdir(parents=True, exist_ok=True)
+def _get_cache_key(
+    topic: str,
+    content: str,
+    difficulty: str,
+    question_type: str,
+    num_questions: Optional[int] = None,
+    user_context: Optional[str] = None,
+    model_name: Optional[str] = None,
+    prompt_version: Optional[str] = None
+) -> str:
+    """Generate a cache key from the full content and every generation parameter."""
+    return make_cache_key(
+        content,
+        topic=topic,
+        difficulty=difficulty,
+        question_type=question_type,
+        num_questions=num_questions,
+        user_context=user_context,
+        model=model_name,
+        prompt_version=prompt_version
+    )
+
+
+def _get_question_cache() -> QuestionCache:
+    """The shared question cache, importing the old JSON-file cache on first use."""
+    global _legacy_checked
+    cache = get_question_cache()
+    if not _legacy_checked:
+        _legacy_checked = True
+        try:
+            cache.import_legacy_json(_legacy_cache_dir)
+        except Exception as e:
+            logger.warning(f"Error importing legacy question cache: {e}")
+    return cache
 
 
 def get_cached_questions(
     topic: str,
     content: str = "",
     difficulty: str = "medium",
-    question_type: str = "multiple_choice"
+    question_type: str = "multiple_choice",
+    **key_params: Any
 ) -> Optional[List[Dict[str, Any]]]:
     """
     Retrieve cached questions if available.
     Returns None if no cache hit.
+    Extra keyword arguments (num_questions, user_context, model_name, prompt_version) are part of the key.
     """
-    _ensure_cache_dir()
-    cache_key = _get_cache_key(topic, content, difficulty, question_type)
-    cache_file = _cache_dir / f"{cache_key}.json"
-    
-    if cache_file.exists():
-        try:
-            with open(cache_file, "r") as f:
-                data = json.load(f)
-                logger.info(f"Cache hit for topic '{topic}' - {len(data['questions'])} questions")
-                return data["questions"]
-        except Exception as e:
-            logger.error(f"Error reading cache: {e}")
-    
-    return None
+    cache_key = _get_cache_key(topic, content, difficulty, question_type, **key_params)
+    try:
+        questions = _get_question_cache().get(cache_key)
+    except Exception as e:
+        logger.error(f"Error reading cache: {e}")
+        return None
+
+    if questions is not None:
+        logger.info(f"Cache hit for topic '{topic}' - {len(questions)} questions")
+    return questions
 
 
 def cache_questions(
@@ -162,24 +272,77 @@ def cache_questions(
     topic: str,
     content: str = "",
     difficulty: str = "medium",
-    question_type: str = "multiple_choice"
+    question_type: str = "multiple_choice",
+    **key_params: Any
 ):
-    """Cache generated questions for future use."""
-    _ensure_cache_dir()
-    cache_key = _get_cache_key(topic, content, difficulty, question_type)
-    cache_file = _cache_dir / f"{cache_key}.json"
-    
+    """Cache generated questions for future use (same key arguments as get_cached_questions)."""
+    cache_key = _get_cache_key(topic, content, difficulty, question_type, **key_params)
     try:
-        with open(cache_file, "w") as f:
-            json.dump({
-                "topic": topic,
-                "difficulty": difficulty,
-                "question_type": question_type,
-                "questions": questions
-            }, f)
+        _get_question_cache().put(cache_key, questions, topic, difficulty, question_type)
         logger.info(f"Cached {len(questions)} questions for topic '{topic}'")
     except Exception as e:
         logger.error(f"Error writing cache: {e}")
+        return
+
+    # Keep the similarity index current without waiting for the next search
+    if get_model() is not None:
+        try:
+            with _index_lock:
+                _sync_question_index()
+        except Exception as e:
+            logger.warning(f"Error indexing cached questions: {e}")
+
+
+def get_question_cache_stats() -> Dict[str, Any]:
+    """Cache counters (shared by all workers) plus this process's index size."""
+    stats = _get_question_cache().stats()
+    with _index_lock:
+        stats["indexed_questions"] = len(_question_index)
+        stats["index_kind"] = _question_index.kind
+    return stats
+
+
+def _index_cache_entry(key: str, topic: str, questions: List[Dict[str, Any]]):
+    """Add (or replace) one cache entry's questions in the question index."""
+    _unindex_cache_entry(key)
+    questions = [dict(q, _source_topic=topic or "unknown") for q in questions]
+    if not questions:
+        return
+    embeddings = encode_texts([q.get("description", "") for q in questions])
+    if embeddings is not None:
+        _indexed_entries[key] = _question_index.add(embeddings, questions)
+
+
+def _unindex_cache_entry(key: str):
+    previous = _indexed_entries.pop(key, None)
+    if previous:
+        _question_index.remove(previous)
+
+
+def _sync_question_index():
+    """
+    Apply cache writes and evictions made since the last sync (by this or another worker).
+    Only entries with a newer write sequence are read; if the removal log no longer reaches
+    back to our last sync, the index is rebuilt from scratch (an empty index has nothing
+    to remove, so it skips that check).
+    """
+    global _question_index, _indexed_seq, _indexed_removal_seq
+    cache = _get_question_cache()
+
+    removed, removal_seq, complete = cache.removals_since(_indexed_removal_seq)
+    if not complete and _indexed_seq:
+        logger.info("Question cache removal log was truncated; rebuilding question index")
+        _question_index = QuestionIndex()
+        _indexed_entries.clear()
+        _indexed_seq = 0
+    else:
+        for key in removed:
+            _unindex_cache_entry(key)
+    _indexed_removal_seq = removal_seq
+
+    for key, seq, topic, questions in cache.changes_since(_indexed_seq):
+        _index_cache_entry(key, topic, questions)
+        _indexed_seq = seq
 
 
 def find_similar_cached_questions(
@@ -190,48 +353,22 @@ def find_similar_cached_questions(
     """
     Find questions from cache that are semantically similar to the topic.
     Useful for supplementing API-generated questions.
+    Searches the incrementally maintained question index instead of re-reading the cache.
     """
-    _ensure_cache_dir()
     model = get_model()
     
     if model is None:
         return []
     
-    all_questions = []
-    
-    # Load all cached questions
-    for cache_file in _cache_dir.glob("*.json"):
-        try:
-            with open(cache_file, "r") as f:
-                data = json.load(f)
-                for q in data.get("questions", []):
-                    q["_source_topic"] = data.get("topic", "unknown")
-                    all_questions.append(q)
-        except Exception as e:
-            logger.warning(f"Error reading cache file {cache_file}: {e}")
-    
-    if not all_questions:
-        return []
-    
     try:
-        # Compute similarity of each question to the topic
-        topic_embedding = model.encode(topic, convert_to_numpy=True)
-        question_texts = [q.get("description", "") for q in all_questions]
-        question_embeddings = model.encode(question_texts, convert_to_numpy=True)
-        
-        from numpy import dot
-        from numpy.linalg import norm
-        
-        scored_questions = []
-        for idx, q_emb in enumerate(question_embeddings):
-            similarity = dot(topic_embedding, q_emb) / (norm(topic_embedding) * norm(q_emb))
-            if similarity >= similarity_threshold:
-                scored_questions.append((all_questions[idx], float(similarity)))
-        
-        # Sort by similarity and return top N
-        scored_questions.sort(key=lambda x: x[1], reverse=True)
+        with _index_lock:
+            _sync_question_index()
+            if not len(_question_index):
+                return []
+            topic_embedding = encode_texts([topic])[0]
+            hits = _question_index.search(topic_embedding, num_questions, similarity_threshold)
         
-        return [q for q, _ in scored_questions[:num_questions]]
+        return [dict(q) for q, _ in hits]
     
     except Exception as e:
         logger.error(f"Error finding similar cached questions: {e}")
@@ -306,37 +443,19 @@ def batch_validate_locally(questions: List[Dict[str, Any]]) -> Tuple[List[Dict[s
 
 # ============ Content Summarization (for token reduction) ============
 
-def chunk_content(content: str, max_chunk_size: int = 2000) -> List[str]:
+def chunk_content(content: str, max_tokens: int = CHUNK_MAX_TOKENS) -> List[str]:
     """
     Split content into semantic chunks for processing.
     Helps reduce API token usage by sending only relevant chunks.
     """
-    if len(content) <= max_chunk_size:
-        return [content]
-    
-    # Split by paragraphs first
-    paragraphs = content.split("\n\n")
-    chunks = []
-    current_chunk = ""
-    
-    for para in paragraphs:
-        if len(current_chunk) + len(para) <= max_chunk_size:
-            current_chunk += para + "\n\n"
-        else:
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-            current_chunk = para + "\n\n"
-    
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-    
-    return chunks
+    return [chunk.text for chunk in iter_chunks(content, max_tokens)]
 
 
-def get_most_relevant_chunk(chunks: List[str], topic: str) -> str:
+def get_most_relevant_chunk(chunks: List[str], topic: str, chunk_embeddings=None) -> str:
     """
     Find the most relevant content chunk for a given topic.
     Useful for focusing API calls on relevant content only.
+    Pass `chunk_embeddings` (one row per chunk) to skip encoding the chunks.
     """
     model = get_model()
     
@@ -344,8 +463,11 @@ def get_most_relevant_chunk(chunks: List[str], topic: str) -> str:
         return chunks[0] if chunks else ""
     
     try:
-        topic_embedding = model.encode(topic, convert_to_numpy=True)
-        chunk_embeddings = model.encode(chunks, convert_to_numpy=True)
+        if chunk_embeddings is None:
+            embeddings = encode_texts([topic] + chunks)
+            topic_embedding, chunk_embeddings = embeddings[0], embeddings[1:]
+        else:
+            topic_embedding = encode_texts([topic])[0]
         
         from numpy import dot
         from numpy.linalg import norm
@@ -0,0 +1,81 @@
+"""
+Local Store - shared setup for the single-file SQLite stores under ./data
+(embedding store, question cache, extraction cache).
+"""
+
+import sqlite3
+import threading
+from pathlib import Path
+
+# How long a writer waits for another process/worker to release the database
+BUSY_TIMEOUT_MS = 5000
+
+
+def connect_local_db(path: Path) -> sqlite3.Connection:
+    """
+    Open a SQLite file for use from several threads and uvicorn workers.
+    WAL lets readers proceed while one writer commits; callers serialize their own
+    threads with a lock (see LocalStore).
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    return conn
+
+
+class LocalStore:
+    """Base class holding one lazily opened connection guarded by a lock."""
+
+    schema = ""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._conn = None
+        self._lock = threading.RLock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            with self._lock:
+                if self._conn is None:
+                    conn = connect_local_db(self.path)
+                    conn.executescript(self.schema)
+                    self._migrate(conn)
+                    self._conn = conn
+        return self._conn
+
+    def _migrate(self, conn: sqlite3.Connection):
+        """Upgrade a file created by an older schema (called once per connection)."""
+
+    def _transaction(self, fn, *args):
+        """Run fn(*args) inside BEGIN IMMEDIATE ... COMMIT, holding the write lock for its duration."""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(*args)
+                self.conn.execute("COMMIT")
+                return result
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def _bump(self, name: str, delta: int = 1) -> int:
+        """Add `delta` to a row of the store's `counters` table (call inside a transaction)."""
+        self.conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, delta)
+        )
+        return self.conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()[0]
+
+    def _counters(self) -> dict:
+        with self._lock:
+            return dict(self.conn.execute("SELECT name, value FROM counters").fetchall())
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -136,3 +136,12 @@ class Question(Base):
     __table_args__ = (
         Index('idx_set_order', 'question_set_id', 'order_index'),
     )
+
+class StatCounter(Base):
+    """Dashboard counters maintained on write (see backend/services/counters.py)."""
+    __tablename__ = "stat_counters"
+
+    scope = Column(String, primary_key=True)  # "global" or "user"
+    owner_id = Column(Integer, primary_key=True, default=0)  # user id for "user" scope, 0 for "global"
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
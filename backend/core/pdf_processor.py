@@ -1,18 +1,267 @@
-import fitz  # PyMuPDF
+import os
+import re
+import time
 import logging
+import tempfile
+import threading
+import multiprocessing
+import multiprocessing.util
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import fitz  # PyMuPDF
 
 logger = logging.getLogger(__name__)
 
-def extract_text_from_pdf(file_bytes: bytes) -> str:
+# Worker processes for page-sharded extraction (1 = always extract on the calling thread)
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Documents shorter than this are extracted serially; process start-up isn't worth it
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+# Pages handed to a worker at a time
+PDF_PAGES_PER_SHARD = int(os.getenv("PDF_PAGES_PER_SHARD", "32"))
+
+PdfSource = Union[bytes, str, Path]
+
+_PAGE_RANGE = re.compile(r"(\d+)\s*(-\s*(\d*))?")
+
+
+class PageText(NamedTuple):
+    number: int  # 0-based page index
+    text: str
+    seconds: float  # time spent in get_text() for this page
+
+
+class OutlineEntry(NamedTuple):
+    level: int
+    title: str
+    start_page: int  # 1-based, inclusive
+    end_page: int  # 1-based, inclusive
+
+
+def _open(source: PdfSource) -> "fitz.Document":
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(str(source))
+
+
+def _iter_serial(doc: "fitz.Document", numbers: Sequence[int]) -> Iterator[PageText]:
+    for number in numbers:
+        began = time.perf_counter()
+        text = doc[number].get_text()
+        yield PageText(number, text, time.perf_counter() - began)
+
+
+def _extract_pages(path: str, numbers: Sequence[int]) -> List[PageText]:
+    """Worker entry point: open the document independently and extract the given pages."""
+    doc = fitz.open(path)
+    try:
+        return list(_iter_serial(doc, numbers))
+    finally:
+        doc.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Shared extraction pool, started on first use (spawned: forking a threaded server is unsafe)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            # Inside a multiprocessing child (e.g. uvicorn --workers) child processes are joined
+            # before atexit handlers run, so stop the pool from a finalizer instead
+            multiprocessing.util.Finalize(None, shutdown_pool, kwargs={"wait": True}, exitpriority=100)
+        return _pool
+
+
+def shutdown_pool(wait: bool = False):
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=wait, cancel_futures=True)
+            _pool = None
+
+
+def iter_pdf_pages(source: PdfSource, parallel: Optional[bool] = None, pages: Optional[Sequence[int]] = None) -> Iterator[PageText]:
     """
-    Extracts text from a PDF file provided as bytes.
+    Yield the text of every page (or only `pages`, 0-based), in page order, as soon as it is available.
+    Large documents are split into page ranges extracted by a process pool, each worker
+    opening the file itself; pages from the first range are yielded while later ranges
+    are still being extracted. In-memory documents are spooled to a temp file once so
+    workers receive a path rather than a copy of the bytes.
+    `parallel` forces either mode; by default documents of PDF_PARALLEL_MIN_PAGES or more are sharded.
     """
+    began = time.perf_counter()
+    slowest = PageText(-1, "", 0.0)
+
+    doc = _open(source)
+    numbers = range(doc.page_count) if pages is None else sorted(set(pages))
+    page_count = len(numbers)
+
+    if parallel is None:
+        parallel = PDF_EXTRACT_WORKERS > 1 and page_count >= PDF_PARALLEL_MIN_PAGES
+
+    if not parallel:
+        try:
+            for page in _iter_serial(doc, numbers):
+                slowest = max(slowest, page, key=lambda p: p.seconds)
+                yield page
+        finally:
+            doc.close()
+        _log_timings(page_count, began, slowest, 1)
+        return
+    doc.close()
+
+    spooled = None
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        spooled = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+        with spooled:
+            spooled.write(source)
+        path = spooled.name
+    else:
+        path = str(source)
+
+    futures = []
+    done = 0
     try:
-        doc = fitz.open(stream=file_bytes, filetype="pdf")
-        text = ""
-        for page in doc:
-            text += page.get_text() + "\n"
-        return text
+        try:
+            pool = _get_pool()
+            for start in range(0, page_count, PDF_PAGES_PER_SHARD):
+                futures.append(pool.submit(_extract_pages, path, list(numbers[start:start + PDF_PAGES_PER_SHARD])))
+            for future in futures:
+                for page in future.result():
+                    slowest = max(slowest, page, key=lambda p: p.seconds)
+                    done += 1
+                    yield page
+        except BrokenProcessPool as e:
+            # A crashed worker poisons the pool: drop it and finish on this thread
+            logger.warning(f"PDF extraction pool failed ({e}); extracting remaining pages serially")
+            shutdown_pool()
+            doc = _open(path)
+            try:
+                for page in _iter_serial(doc, numbers[done:]):
+                    yield page
+            finally:
+                doc.close()
+        _log_timings(page_count, began, slowest, PDF_EXTRACT_WORKERS)
+    finally:
+        # Stop outstanding shards if the consumer stopped early or a shard failed
+        for future in futures:
+            future.cancel()
+        if spooled is not None:
+            for future in futures:
+                if not future.cancelled():
+                    future.exception()  # wait so no worker still has the file open
+            os.unlink(path)
+
+
+def _log_timings(page_count: int, began: float, slowest: PageText, workers: int):
+    if not page_count:
+        return
+    elapsed = time.perf_counter() - began
+    logger.info(
+        f"Extracted {page_count} pages in {elapsed:.2f}s with {workers} worker(s) "
+        f"({page_count / elapsed if elapsed else 0:.0f} pages/s; slowest page {slowest.number + 1} took {slowest.seconds * 1000:.0f}ms)"
+    )
+
+
+def extract_text_from_pdf(source: PdfSource, parallel: Optional[bool] = None) -> str:
+    """
+    Extracts text from a PDF file provided as bytes or a path.
+    """
+    try:
+        parts = []
+        for page in iter_pdf_pages(source, parallel):
+            parts.append(page.text)
+            parts.append("\n")
+        return "".join(parts)
     except Exception as e:
         logger.error(f"Error extracting text from PDF: {e}")
         return ""
+
+
+def get_outline(source: PdfSource) -> Tuple[int, List[OutlineEntry]]:
+    """
+    Page count and bookmark outline (PyMuPDF's TOC). Each section runs until the next
+    entry at the same or a higher level.
+    """
+    doc = _open(source)
+    try:
+        page_count = doc.page_count
+        toc = doc.get_toc(simple=True)
+    finally:
+        doc.close()
+
+    outline = []
+    for index, (level, title, page) in enumerate(toc):
+        # Entries without a target page (page < 1) can't be selected
+        if page < 1:
+            continue
+        end = page_count
+        for next_level, _, next_page in toc[index + 1:]:
+            if next_level <= level and next_page >= 1:
+                end = max(page, next_page - 1)
+                break
+        outline.append(OutlineEntry(level, title.strip(), page, min(end, page_count)))
+    return page_count, outline
+
+
+def parse_page_ranges(spec: str, page_count: int) -> List[int]:
+    """
+    Parse a 1-based page spec like "1-5, 8, 12-" into sorted 0-based page numbers.
+    Raises ValueError for malformed or out-of-range specs.
+    """
+    numbers = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        match = _PAGE_RANGE.fullmatch(part)
+        if not match:
+            raise ValueError(f"Invalid page range '{part}'")
+        first = int(match.group(1))
+        if match.group(2) is None:
+            last = first
+        else:
+            last = int(match.group(3)) if match.group(3) else page_count
+        if first > last:
+            raise ValueError(f"Invalid page range '{part}'")
+        if first < 1 or last > page_count:
+            raise ValueError(f"Page range '{part}' is outside 1-{page_count}")
+        numbers.update(range(first - 1, last))
+    if not numbers:
+        raise ValueError("No pages selected")
+    return sorted(numbers)
+
+
+def resolve_page_selection(source: PdfSource, pages: Optional[str] = None, sections: Optional[Sequence[str]] = None) -> Optional[List[int]]:
+    """
+    0-based pages selected by a page spec and/or outline section titles (case-insensitive;
+    an exact title match wins over substring matches). None means the whole document.
+    """
+    pages = (pages or "").strip()
+    sections = [section.strip() for section in (sections or []) if section and section.strip()]
+    if not pages and not sections:
+        return None
+
+    page_count, outline = get_outline(source)
+    selected = set(parse_page_ranges(pages, page_count)) if pages else set()
+
+    for section in sections:
+        wanted = section.lower()
+        matches = [entry for entry in outline if entry.title.lower() == wanted]
+        if not matches:
+            matches = [entry for entry in outline if wanted in entry.title.lower()]
+        if not matches:
+            raise ValueError(f"No section matching '{section}' in the document outline")
+        for entry in matches:
+            selected.update(range(entry.start_page - 1, entry.end_page))
+
+    return sorted(selected)
@@ -0,0 +1,303 @@
+"""
+Question Cache - single-file SQLite store for generated question sets.
+Entries expire after a TTL and are evicted least-recently-used once the store exceeds
+its byte or entry budget. All writes are transactions (BEGIN IMMEDIATE), so several
+uvicorn workers can share one file safely. Hit/miss/eviction counters live in the same
+file, so stats cover every worker.
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.core.local_store import LocalStore
+
+logger = logging.getLogger(__name__)
+
+QUESTION_CACHE_PATH = os.getenv("QUESTION_CACHE_PATH", "./data/question_cache.db")
+QUESTION_CACHE_TTL_SECONDS = int(os.getenv("QUESTION_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+QUESTION_CACHE_MAX_BYTES = int(os.getenv("QUESTION_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+QUESTION_CACHE_MAX_ENTRIES = int(os.getenv("QUESTION_CACHE_MAX_ENTRIES", "100000"))
+
+# Bump to invalidate every existing entry (key scheme or prompt changes)
+CACHE_KEY_VERSION = os.getenv("QUESTION_CACHE_KEY_VERSION", "2")
+
+# Characters hashed per step, so large documents are never encoded in one piece
+_HASH_BLOCK_CHARS = 1 << 20
+_WHITESPACE = re.compile(r"\s+")
+# Parameters compared case-insensitively
+_CASE_INSENSITIVE = {"topic", "difficulty", "question_type"}
+
+# Removal log rows kept for incremental index syncs; older syncs fall back to a full rebuild
+_REMOVAL_LOG_SIZE = 100000
+
+_COUNTERS = ("seq", "entries", "bytes", "hits", "misses", "stores", "evictions_ttl", "evictions_lru")
+
+
+def content_digest(content: Optional[str]) -> str:
+    """
+    sha256 of the whitespace-normalized content (equivalent to hashing " ".join(content.split())),
+    computed block by block so multi-MB documents are hashed without a normalized copy.
+    """
+    digest = hashlib.sha256()
+    started = False
+    pending_space = False
+    content = content or ""
+    for start in range(0, len(content), _HASH_BLOCK_CHARS):
+        block = content[start:start + _HASH_BLOCK_CHARS]
+        words = _WHITESPACE.sub(" ", block).strip()
+        if not words:
+            pending_space = True
+            continue
+        if started and (pending_space or block[0].isspace()):
+            digest.update(b" ")
+        digest.update(words.encode("utf-8"))
+        started = True
+        pending_space = block[-1].isspace()
+    return digest.hexdigest()
+
+
+def _normalize_param(name: str, value: Any) -> Any:
+    if isinstance(value, str):
+        value = " ".join(value.split())
+        return value.lower() if name in _CASE_INSENSITIVE else value
+    return value
+
+
+def make_cache_key(content: Optional[str], **params: Any) -> str:
+    """
+    Cache key over the full content plus every generation parameter (topic, difficulty,
+    question type, count, user context, model, prompt version, ...) and CACHE_KEY_VERSION.
+    Parameters are normalized (whitespace, case where it carries no meaning); None and ""
+    are treated alike.
+    """
+    header = {name: _normalize_param(name, value) for name, value in params.items() if value not in (None, "")}
+    header["key_version"] = CACHE_KEY_VERSION
+    header["content"] = content_digest(content)
+    return hashlib.sha256(json.dumps(header, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class QuestionCache(LocalStore):
+    schema = """
+        CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY,
+            seq INTEGER NOT NULL,
+            topic TEXT,
+            difficulty TEXT,
+            question_type TEXT,
+            payload TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            accessed_at REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries(accessed_at);
+        CREATE INDEX IF NOT EXISTS idx_entries_created ON entries(created_at);
+        CREATE INDEX IF NOT EXISTS idx_entries_seq ON entries(seq);
+        CREATE TABLE IF NOT EXISTS removals (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            key TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+    """
+
+    def __init__(
+        self,
+        path: str = QUESTION_CACHE_PATH,
+        ttl_seconds: int = QUESTION_CACHE_TTL_SECONDS,
+        max_bytes: int = QUESTION_CACHE_MAX_BYTES,
+        max_entries: int = QUESTION_CACHE_MAX_ENTRIES
+    ):
+        super().__init__(Path(path))
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+
+    # --- helpers (call inside a transaction) ---
+
+    def _log_removals(self, keys: List[str]):
+        self.conn.executemany("INSERT INTO removals (key) VALUES (?)", [(key,) for key in keys])
+        # Bound the removal log
+        self.conn.execute(
+            "DELETE FROM removals WHERE seq <= (SELECT MAX(seq) FROM removals) - ?", (_REMOVAL_LOG_SIZE,)
+        )
+
+    def _delete(self, rows: List[Tuple[str, int]], reason: str):
+        if not rows:
+            return
+        self.conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in rows])
+        self._log_removals([key for key, _ in rows])
+        self._bump("entries", -len(rows))
+        self._bump("bytes", -sum(size for _, size in rows))
+        self._bump(f"evictions_{reason}", len(rows))
+
+    def _evict(self, now: float):
+        expired = self.conn.execute(
+            "SELECT key, size FROM entries WHERE created_at < ?", (now - self.ttl_seconds,)
+        ).fetchall()
+        self._delete(expired, "ttl")
+
+        entries, total_bytes = self._totals()
+        if entries <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+
+        victims = []
+        for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+            if entries <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            victims.append((key, size))
+            entries -= 1
+            total_bytes -= size
+        self._delete(victims, "lru")
+
+    def _totals(self) -> Tuple[int, int]:
+        values = dict(self.conn.execute(
+            "SELECT name, value FROM counters WHERE name IN ('entries', 'bytes')"
+        ).fetchall())
+        return values.get("entries", 0), values.get("bytes", 0)
+
+    # --- public API ---
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Return the cached questions for `key`, or None on a miss (or expired entry)."""
+        def lookup():
+            now = time.time()
+            row = self.conn.execute(
+                "SELECT payload, size, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._bump("misses")
+                return None
+            payload, size, created_at = row
+            if created_at < now - self.ttl_seconds:
+                self._delete([(key, size)], "ttl")
+                self._bump("misses")
+                return None
+            self.conn.execute(
+                "UPDATE entries SET accessed_at = ?, hits = hits + 1 WHERE key = ?", (now, key)
+            )
+            self._bump("hits")
+            return payload
+
+        payload = self._transaction(lookup)
+        return json.loads(payload)["questions"] if payload is not None else None
+
+    def put(self, key: str, questions: List[Dict[str, Any]], topic: str = "", difficulty: str = "", question_type: str = ""):
+        """Insert or replace an entry, then apply TTL and LRU eviction."""
+        payload = json.dumps({"topic": topic, "difficulty": difficulty, "question_type": question_type, "questions": questions})
+        size = len(payload.encode("utf-8"))
+
+        def store():
+            now = time.time()
+            previous = self.conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            seq = self._bump("seq")
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries "
+                "(key, seq, topic, difficulty, question_type, payload, size, created_at, accessed_at, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                (key, seq, topic, difficulty, question_type, payload, size, now, now)
+            )
+            if previous is None:
+                self._bump("entries")
+                self._bump("bytes", size)
+            else:
+                self._bump("bytes", size - previous[0])
+            self._bump("stores")
+            self._evict(now)
+
+        self._transaction(store)
+
+    def changes_since(self, seq: int) -> List[Tuple[str, int, str, List[Dict[str, Any]]]]:
+        """Entries written after `seq`, as (key, seq, topic, questions), oldest first."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT key, seq, topic, payload FROM entries WHERE seq > ? ORDER BY seq", (seq,)
+            ).fetchall()
+        return [(key, row_seq, topic, json.loads(payload)["questions"]) for key, row_seq, topic, payload in rows]
+
+    def removals_since(self, removal_seq: int) -> Tuple[List[str], int, bool]:
+        """
+        Keys removed after `removal_seq`, the newest removal seq, and whether the log
+        still reaches back that far (False means the caller should rebuild from scratch).
+        """
+        with self._lock:
+            oldest = self.conn.execute("SELECT MIN(seq) FROM removals").fetchone()[0]
+            rows = self.conn.execute(
+                "SELECT seq, key FROM removals WHERE seq > ? ORDER BY seq", (removal_seq,)
+            ).fetchall()
+        complete = oldest is None or oldest <= removal_seq + 1
+        latest = rows[-1][0] if rows else removal_seq
+        return [key for _, key in rows], latest, complete
+
+    def clear(self):
+        def wipe():
+            rows = self.conn.execute("SELECT key, size FROM entries").fetchall()
+            self.conn.execute("DELETE FROM entries")
+            self._log_removals([key for key, _ in rows])
+            self.conn.execute("UPDATE counters SET value = 0 WHERE name IN ('entries', 'bytes')")
+            return len(rows)
+
+        return self._transaction(wipe)
+
+    def stats(self) -> Dict[str, Any]:
+        values = self._counters()
+        counters = {name: values.get(name, 0) for name in _COUNTERS if name != "seq"}
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+            "max_bytes": self.max_bytes,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "path": str(self.path)
+        }
+
+    def import_legacy_json(self, directory: Path) -> int:
+        """
+        One-time import of the old one-JSON-file-per-key cache directory.
+
+        The old keys hashed only the first 500 characters of content and no count, model
+        or prompt version, so they cannot be mapped onto make_cache_key(). Entries are
+        stored under `legacy:<stem>` and never match get(); they only seed the
+        similarity index (changes_since) and age out through TTL/LRU like any other entry.
+        """
+        with self._lock:
+            done = self.conn.execute("SELECT value FROM counters WHERE name = 'legacy_imported'").fetchone()
+        if done or not directory.exists():
+            return 0
+
+        imported = 0
+        for cache_file in directory.glob("*.json"):
+            try:
+                with open(cache_file, "r") as f:
+                    data = json.load(f)
+                self.put(
+                    f"legacy:{cache_file.stem}", data.get("questions", []),
+                    data.get("topic", ""), data.get("difficulty", ""), data.get("question_type", "")
+                )
+                imported += 1
+            except Exception as e:
+                logger.warning(f"Skipping legacy cache file {cache_file}: {e}")
+
+        self._transaction(self._bump, "legacy_imported")
+        if imported:
+            logger.info(f"Imported {imported} legacy cache files from {directory}; the directory can be removed")
+        return imported
+
+
+_cache = None
+
+
+def get_question_cache() -> QuestionCache:
+    global _cache
+    if _cache is None:
+        _cache = QuestionCache()
+    return _cache
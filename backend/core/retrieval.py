@@ -0,0 +1,103 @@
+"""
+Retrieval - decides which parts of a long document go into each prompt.
+A document's chunks are ranked against the topic once per generation; every set then
+packs its own top-ranked chunks into a fixed token budget, so prompt size (and with it
+Gemini latency and cost) no longer grows with the document.
+"""
+
+import os
+import logging
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from backend.core.chunker import Chunk, count_tokens, iter_chunks, join_spans
+
+logger = logging.getLogger(__name__)
+
+# Content tokens per generation prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "8000"))
+
+
+class ContentPlan:
+    """
+    Ranked chunks of one document. context_for_set() gives set s of n the chunks at ranks
+    s, s+n, s+2n, ... first, so sets draw on different material, then tops up with the
+    rest of the ranking until the budget is used. Chunks are returned in document order.
+    """
+
+    def __init__(self, text: str, chunks: Sequence[Chunk], ranking: Sequence[int], token_budget: int = CONTEXT_TOKEN_BUDGET):
+        self.text = text
+        self.chunks = list(chunks)
+        self.ranking = list(ranking)
+        self.token_budget = token_budget
+
+    def context_for_set(self, set_index: int, num_sets: int = 1) -> str:
+        """Packed context for 0-based `set_index` out of `num_sets`."""
+        if len(self.chunks) == 1:
+            return self.text
+
+        preferred = self.ranking[set_index % num_sets::num_sets] if num_sets > 1 else self.ranking
+        taken = set(preferred)
+        candidates = preferred + [index for index in self.ranking if index not in taken]
+
+        selected = []
+        used = 0
+        for index in candidates:
+            # Each chunk is charged for the separator it is joined with
+            tokens = self.chunks[index].tokens + 1
+            if used + tokens > self.token_budget:
+                continue
+            selected.append(index)
+            used += tokens
+        if not selected:
+            selected = candidates[:1]
+
+        return join_spans(self.text, [(self.chunks[i].start, self.chunks[i].end) for i in selected])
+
+
+def _rank(chunks: List[str], topic: str, chunk_embeddings=None) -> List[int]:
+    """Chunk indices by similarity to `topic`, or document order without the embedding model."""
+    from backend.core.local_ml import encode_texts
+    from backend.core.vector_index import normalize
+
+    try:
+        if chunk_embeddings is None:
+            chunk_embeddings = encode_texts(chunks)
+        query = encode_texts([topic]) if chunk_embeddings is not None else None
+        if query is None:
+            return list(range(len(chunks)))
+        scores = normalize(chunk_embeddings) @ normalize(query)[0]
+        return np.argsort(-scores, kind="stable").tolist()
+    except Exception as e:
+        logger.error(f"Error ranking chunks: {e}")
+        return list(range(len(chunks)))
+
+
+def plan_content(
+    content: Optional[str],
+    topic: str,
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    document=None
+) -> Optional[ContentPlan]:
+    """
+    Chunk and rank `content` for `topic`. Pass the ExtractedDocument when `content` is its
+    text to reuse its cached chunks and chunk embeddings. None when there is no content.
+    """
+    from backend.core.extraction_cache import document_chunk_embeddings
+
+    if not content:
+        return None
+    total = count_tokens(content)
+    if total <= token_budget:
+        return ContentPlan(content, [Chunk(content, 0, len(content), total)], [0], token_budget)
+
+    if document is not None and document.text == content:
+        chunks = list(document.iter_chunks())
+        ranking = _rank([chunk.text for chunk in chunks], topic, document_chunk_embeddings(document))
+    else:
+        chunks = list(iter_chunks(content))
+        ranking = _rank([chunk.text for chunk in chunks], topic)
+
+    logger.info(f"Ranked {len(chunks)} chunks ({total} tokens) into a {token_budget}-token budget per prompt")
+    return ContentPlan(content, chunks, ranking, token_budget)
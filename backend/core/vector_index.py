@@ -0,0 +1,288 @@
+"""
+Vector Index - in-memory nearest-neighbour search over normalized embeddings.
+FlatIndex scans one contiguous matrix (exact, fine up to ~100k vectors); IVFIndex clusters
+vectors with spherical k-means and scans only the `nprobe` closest clusters per query.
+QuestionIndex starts flat and switches to IVF once it grows past IVF_THRESHOLD.
+Vectors are stored once (inside whichever index is active), so 1M x 384-d costs ~1.5 GB.
+"""
+
+import os
+import logging
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+IVF_THRESHOLD = int(os.getenv("VECTOR_INDEX_IVF_THRESHOLD", "100000"))
+IVF_NPROBE = int(os.getenv("VECTOR_INDEX_NPROBE", "16"))
+# Compact (drop tombstoned rows and renumber) once this fraction of rows is dead
+COMPACT_FRACTION = float(os.getenv("VECTOR_INDEX_COMPACT_FRACTION", "0.25"))
+
+# k-means settings for IVF training
+_KMEANS_ITERATIONS = 10
+_KMEANS_SAMPLES_PER_LIST = 64
+# Rows per matmul when assigning many vectors to centroids
+_ASSIGN_BATCH = 65536
+
+
+def normalize(vectors) -> np.ndarray:
+    matrix = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class _GrowableMatrix:
+    """Row-appendable float32 matrix (amortized doubling) with a parallel id array."""
+
+    def __init__(self, dim: int, capacity: int = 1024):
+        self.data = np.empty((capacity, dim), dtype=np.float32)
+        self.ids = np.empty(capacity, dtype=np.int64)
+        self.size = 0
+
+    def append(self, ids: np.ndarray, vectors: np.ndarray):
+        needed = self.size + len(vectors)
+        if needed > len(self.data):
+            capacity = max(needed, len(self.data) * 2)
+            data = np.empty((capacity, self.data.shape[1]), dtype=np.float32)
+            data[:self.size] = self.data[:self.size]
+            new_ids = np.empty(capacity, dtype=np.int64)
+            new_ids[:self.size] = self.ids[:self.size]
+            self.data, self.ids = data, new_ids
+        self.data[self.size:needed] = vectors
+        self.ids[self.size:needed] = ids
+        self.size = needed
+
+    def view(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self.data[:self.size], self.ids[:self.size]
+
+
+def _top_k(scores: np.ndarray, ids: np.ndarray, k: int, threshold: Optional[float], alive: Optional[np.ndarray]) -> List[Tuple[int, float]]:
+    if alive is not None:
+        keep = alive[ids]
+        scores, ids = scores[keep], ids[keep]
+    if threshold is not None:
+        keep = scores >= threshold
+        scores, ids = scores[keep], ids[keep]
+    if len(scores) > k:
+        part = np.argpartition(-scores, k - 1)[:k]
+        scores, ids = scores[part], ids[part]
+    order = np.argsort(-scores, kind="stable")
+    return [(int(ids[i]), float(scores[i])) for i in order]
+
+
+class FlatIndex:
+    """Exact search: one matmul over every stored vector."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._matrix = _GrowableMatrix(dim)
+
+    def __len__(self):
+        return self._matrix.size
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray):
+        self._matrix.append(ids, vectors)
+
+    def vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self._matrix.view()
+
+    def search(self, query: np.ndarray, k: int, threshold: Optional[float] = None, alive: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        data, ids = self._matrix.view()
+        if not len(ids):
+            return []
+        return _top_k(data @ query, ids, k, threshold, alive)
+
+
+class IVFIndex:
+    """Inverted-file index: vectors are bucketed under their nearest k-means centroid."""
+
+    def __init__(self, dim: int, n_lists: int, nprobe: int = IVF_NPROBE):
+        self.dim = dim
+        self.n_lists = n_lists
+        self.nprobe = min(nprobe, n_lists)
+        self.centroids: Optional[np.ndarray] = None
+        self._lists = [_GrowableMatrix(dim, capacity=64) for _ in range(n_lists)]
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def train(self, vectors: np.ndarray, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        n_samples = min(len(vectors), self.n_lists * _KMEANS_SAMPLES_PER_LIST)
+        sample = vectors[rng.choice(len(vectors), n_samples, replace=False)]
+        centroids = sample[rng.choice(n_samples, self.n_lists, replace=False)].copy()
+
+        for _ in range(_KMEANS_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=self.n_lists)
+            empty = counts == 0
+            # Re-seed empty clusters from random samples so every list stays useful
+            sums[empty] = sample[rng.choice(n_samples, int(empty.sum()))]
+            centroids = normalize(sums)
+
+        self.centroids = centroids
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.concatenate([
+            np.argmax(vectors[start:start + _ASSIGN_BATCH] @ self.centroids.T, axis=1)
+            for start in range(0, len(vectors), _ASSIGN_BATCH)
+        ]) if len(vectors) else np.empty(0, dtype=np.int64)
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray):
+        assignment = self._assign(vectors)
+        order = np.argsort(assignment, kind="stable")
+        lists, starts = np.unique(assignment[order], return_index=True)
+        bounds = list(starts[1:]) + [len(order)]
+        for list_no, start, end in zip(lists, starts, bounds):
+            rows = order[start:end]
+            self._lists[list_no].append(ids[rows], vectors[rows])
+        self._size += len(vectors)
+
+    def vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        parts = [lst.view() for lst in self._lists if lst.size]
+        if not parts:
+            return np.empty((0, self.dim), dtype=np.float32), np.empty(0, dtype=np.int64)
+        return np.concatenate([part[0] for part in parts]), np.concatenate([part[1] for part in parts])
+
+    def search(self, query: np.ndarray, k: int, threshold: Optional[float] = None, alive: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        probes = np.argpartition(-(self.centroids @ query), self.nprobe - 1)[:self.nprobe]
+        parts = [self._lists[p].view() for p in probes if self._lists[p].size]
+        if not parts:
+            return []
+        data = np.concatenate([part[0] for part in parts])
+        ids = np.concatenate([part[1] for part in parts])
+        return _top_k(data @ query, ids, k, threshold, alive)
+
+
+class QuestionIndex:
+    """
+    Incrementally maintained index of cached questions.
+    Each added vector gets a sequential id mapped to its payload (the question dict);
+    removed ids are tombstoned, and once more than `compact_fraction` of the rows are
+    tombstones the live rows are copied into a fresh index. Ids stay stable across
+    compaction: rows keep ascending id order, so an id is found by binary search.
+    Starts as a FlatIndex and is rebuilt as an IVFIndex once it holds more than
+    `ivf_threshold` vectors (and re-trained each time it quadruples).
+    """
+
+    def __init__(self, ivf_threshold: int = IVF_THRESHOLD, nprobe: int = IVF_NPROBE, compact_fraction: float = COMPACT_FRACTION):
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self.compact_fraction = compact_fraction
+        self._index = None
+        # Per row (the ids the inner index stores); _alive and _row_ids grow by doubling
+        self._payloads: List[Any] = []
+        self._alive = np.zeros(0, dtype=bool)
+        self._row_ids = np.zeros(0, dtype=np.int64)
+        self._rows = 0
+        self._dead = 0
+        self._next_id = 0
+        self._trained_at = 0
+
+    def __len__(self):
+        return self._rows - self._dead
+
+    @property
+    def kind(self) -> str:
+        return "ivf" if isinstance(self._index, IVFIndex) else "flat"
+
+    def _reserve(self, needed: int):
+        if needed <= len(self._alive):
+            return
+        capacity = max(needed, len(self._alive) * 2, 1024)
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._rows] = self._alive[:self._rows]
+        row_ids = np.zeros(capacity, dtype=np.int64)
+        row_ids[:self._rows] = self._row_ids[:self._rows]
+        self._alive, self._row_ids = alive, row_ids
+
+    def add(self, vectors, payloads: List[Any]) -> List[int]:
+        if not payloads:
+            return []
+        vectors = normalize(vectors)
+        count = len(payloads)
+        rows = np.arange(self._rows, self._rows + count, dtype=np.int64)
+        ids = np.arange(self._next_id, self._next_id + count, dtype=np.int64)
+
+        if self._index is None:
+            self._index = FlatIndex(vectors.shape[1])
+        self._reserve(self._rows + count)
+        self._alive[rows] = True
+        self._row_ids[rows] = ids
+        self._payloads.extend(payloads)
+        self._rows += count
+        self._next_id += count
+        self._index.add(rows, vectors)
+
+        total = len(self._index)
+        if total > self.ivf_threshold and total >= self._trained_at * 4:
+            self._rebuild_ivf()
+        return ids.tolist()
+
+    def remove(self, ids: List[int]):
+        if not ids or not self._rows:
+            return
+        ids = np.asarray(ids, dtype=np.int64)
+        row_ids = self._row_ids[:self._rows]
+        rows = np.minimum(np.searchsorted(row_ids, ids), self._rows - 1)
+        rows = np.unique(rows[(row_ids[rows] == ids) & self._alive[rows]])
+        self._alive[rows] = False
+        for row in rows.tolist():
+            self._payloads[row] = None
+        self._dead += len(rows)
+        if self._dead and self._dead > self.compact_fraction * self._rows:
+            self._compact()
+
+    def _live(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Live vectors and their rows, in row order."""
+        vectors, rows = self._index.vectors()
+        keep = self._alive[rows]
+        vectors, rows = vectors[keep], rows[keep]
+        order = np.argsort(rows, kind="stable")
+        return vectors[order], rows[order]
+
+    def _renumber(self, rows: np.ndarray) -> np.ndarray:
+        """Keep only `rows` (ascending), renumbered 0..n-1; returns the new row numbers."""
+        count = len(rows)
+        self._payloads = [self._payloads[row] for row in rows.tolist()]
+        self._row_ids[:count] = self._row_ids[rows]
+        self._alive[:count] = True
+        self._alive[count:] = False
+        self._rows, self._dead = count, 0
+        return np.arange(count, dtype=np.int64)
+
+    def _compact(self):
+        vectors, rows = self._live()
+        logger.debug(f"Compacting question index: {self._dead} of {self._rows} rows removed")
+        rows = self._renumber(rows)
+        if isinstance(self._index, IVFIndex):
+            index = IVFIndex(self._index.dim, self._index.n_lists, self.nprobe)
+            index.centroids = self._index.centroids
+        else:
+            index = FlatIndex(self._index.dim)
+        index.add(rows, vectors)
+        self._index = index
+
+    def _rebuild_ivf(self):
+        # Tombstoned vectors are dropped for good on rebuild
+        vectors, rows = self._live()
+        rows = self._renumber(rows)
+        n_lists = int(min(4096, max(16, np.sqrt(len(rows)))))
+        logger.info(f"Building IVF index over {len(rows)} vectors with {n_lists} lists")
+        ivf = IVFIndex(self._index.dim, n_lists, self.nprobe)
+        ivf.train(vectors)
+        ivf.add(rows, vectors)
+        self._index = ivf
+        self._trained_at = len(rows)
+
+    def search(self, query, k: int, threshold: Optional[float] = None) -> List[Tuple[Any, float]]:
+        if self._index is None or k <= 0:
+            return []
+        query = normalize(query)[0]
+        hits = self._index.search(query, k, threshold, self._alive)
+        return [(self._payloads[row], score) for row, score in hits]
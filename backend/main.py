@@ -5,8 +5,10 @@ import io
 import json
 import uvicorn
 from datetime import timedelta, datetime
-from typing import List, Optional, Set
+from typing import List, Optional, Set, Tuple
 import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -14,12 +16,14 @@ load_dotenv(os.path.join(root_dir, '.env'))
 
 sys.path.append(root_dir)
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, status, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Query, status, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse, StreamingResponse, Response, FileResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from fpdf import FPDF
 from pathlib import Path
 from typing import Dict, Set
@@ -27,8 +31,14 @@ import asyncio
 
 from backend.services.generator import QuestionGenerator
 from backend.services.validator import QuestionValidator
-from backend.core.pdf_processor import extract_text_from_pdf
-from backend.core.database import engine, get_db, Base
+from backend.core.pdf_processor import get_outline, resolve_page_selection, shutdown_pool as shutdown_pdf_pool
+from backend.core.extraction_cache import ExtractedDocument, extract_document, select_relevant_text
+from backend.services.uploads import SpooledUpload, spool_upload
+from backend.services.stats import users_with_stats
+from backend.services.history import HISTORY_MAX_PAGE_SIZE, HISTORY_PAGE_SIZE, history_page
+from backend.services import queries
+from backend.services import counters
+from backend.core.database import engine, async_engine, get_db, get_async_db, Base, SessionLocal
 from backend.core import models
 from backend.services import auth
 from backend import schemas
@@ -36,6 +46,22 @@ from backend import schemas
 from contextlib import asynccontextmanager
 
 
+def _reconcile_counters():
+    db = SessionLocal()
+    try:
+        counters.reconcile_counters(db)
+    except Exception as e:
+        print(f"Error reconciling counters: {e}")
+    finally:
+        db.close()
+
+
+async def _reconcile_counters_periodically():
+    while True:
+        await asyncio.sleep(counters.COUNTER_RECONCILE_SECONDS)
+        await run_in_threadpool(_reconcile_counters)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
 
@@ -56,14 +82,22 @@ async def lifespan(app: FastAPI):
             if not user.is_admin:
                 user.is_admin = True
                 db.commit()
+                auth.invalidate_principal(admin_email)
             print(f"Admin user exists: {admin_email}")
     except Exception as e:
         print(f"Error seeding admin user: {e}")
     finally:
         db.close()
-    
+
+    await run_in_threadpool(_reconcile_counters)
+    reconcile_task = asyncio.create_task(_reconcile_counters_periodically())
+
     yield
 
+    reconcile_task.cancel()
+    shutdown_pdf_pool()
+    if async_engine is not None:
+        await async_engine.dispose()
 
 
 Base.metadata.create_all(bind=engine)
@@ -125,10 +159,27 @@ async def websocket_admin_sessions(websocket: WebSocket):
         manager.disconnect(websocket)
 
 
+def _find_login_user(db: Session, email: str) -> Optional[Tuple[int, str, str]]:
+    """
+    (id, email, hashed_password) for `email`. Closes the session before returning so its
+    pooled connection isn't held while the request waits on the password hash pool.
+    """
+    try:
+        user = db.query(models.User).filter(models.User.email == email).first()
+        return (user.id, user.email, user.hashed_password) if user else None
+    finally:
+        db.close()
+
+def _store_rehashed_password(db: Session, user_id: int, new_hash: str):
+    user = db.get(models.User, user_id)
+    if user is not None:
+        user.hashed_password = new_hash
+        db.commit()
+
 @app.post("/token", response_model=schemas.Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     try:
-        user = db.query(models.User).filter(models.User.email == form_data.username).first()
+        user = await run_in_threadpool(_find_login_user, db, form_data.username)
         if not user:
             print(f"User not found: {form_data.username}")
             raise HTTPException(
@@ -137,17 +188,22 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        if not auth.verify_password(form_data.password, user.hashed_password):
+        user_id, email, hashed_password = user
+        verified, new_hash = await auth.verify_and_update_password(form_data.password, hashed_password)
+        if not verified:
             print(f"Password verification failed for: {form_data.username}")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect username or password",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        if new_hash:
+            # Stored hash used old argon2 parameters
+            await run_in_threadpool(_store_rehashed_password, db, user_id, new_hash)
             
         access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = auth.create_access_token(
-            data={"sub": user.email}, expires_delta=access_token_expires
+            data={"sub": email}, expires_delta=access_token_expires
         )
         return {"access_token": access_token, "token_type": "bearer"}
     except Exception as e:
@@ -155,39 +211,44 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
         raise e
 
 @app.get("/users/me", response_model=schemas.User)
-async def read_users_me(current_user: models.User = Depends(auth.get_current_user)):
+async def read_users_me(current_user: auth.Principal = Depends(auth.get_current_user)):
     return current_user
 
 
 @app.get("/users", response_model=List[schemas.User])
-def get_all_users(current_user: models.User = Depends(auth.get_current_admin), db: Session = Depends(get_db)):
+def get_all_users(current_user: auth.Principal = Depends(auth.get_current_admin), db: Session = Depends(get_db)):
     return db.query(models.User).all()
 
-@app.post("/users", response_model=schemas.User)
-def create_user_by_admin(user: schemas.UserCreate, current_user: models.User = Depends(auth.get_current_admin), db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    hashed_password = auth.get_password_hash(user.password)
-    new_user = models.User(email=user.email, hashed_password=hashed_password)
+def _add_user(db: Session, email: str, hashed_password: str) -> models.User:
+    new_user = models.User(email=email, hashed_password=hashed_password)
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
     return new_user
 
+@app.post("/users", response_model=schemas.User)
+async def create_user_by_admin(user: schemas.UserCreate, current_user: auth.Principal = Depends(auth.get_current_admin), db: Session = Depends(get_db)):
+    db_user = await run_in_threadpool(_find_login_user, db, user.email)
+    if db_user:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    hashed_password = await auth.hash_password(user.password)
+    return await run_in_threadpool(_add_user, db, user.email, hashed_password)
+
 @app.delete("/users/{user_id}")
-def delete_user(user_id: int, current_user: models.User = Depends(auth.get_current_admin), db: Session = Depends(get_db)):
+def delete_user(user_id: int, current_user: auth.Principal = Depends(auth.get_current_admin), db: Session = Depends(get_db)):
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if user.email == current_user.email:
         raise HTTPException(status_code=400, detail="Cannot delete yourself")
+    email = user.email
     db.delete(user)
     db.commit()
+    auth.invalidate_principal(email)
     return {"message": "User deleted"}
 
 @app.put("/users/{user_id}/toggle-active")
-def toggle_user_active(user_id: int, current_user: models.User = Depends(auth.get_current_admin), db: Session = Depends(get_db)):
+def toggle_user_active(user_id: int, current_user: auth.Principal = Depends(auth.get_current_admin), db: Session = Depends(get_db)):
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -196,6 +257,7 @@ def toggle_user_active(user_id: int, current_user: models.User = Depends(auth.ge
     
     user.is_active = not user.is_active
     db.commit()
+    auth.invalidate_principal(user.email)
     return {"message": f"User active status: {user.is_active}"}
 
 
@@ -240,6 +302,156 @@ async def get_features():
         }
     }
 
+# Dedicated pool for /generate pipelines so long generations never run on the event loop
+# and never compete with sync endpoints for the default threadpool
+GENERATION_WORKERS = int(os.getenv("GENERATION_WORKERS", "8"))
+generation_executor = ThreadPoolExecutor(max_workers=GENERATION_WORKERS, thread_name_prefix="qgen-stream")
+
+# Queued once the worker has returned, after all of its events
+_PIPELINE_DONE = object()
+
+
+def run_generation_pipeline(
+    session_pk: int,
+    user_id: int,
+    task_id: Optional[int],
+    generate_kwargs: dict,
+    emit,
+    cancelled: threading.Event
+) -> dict:
+    """
+    Runs generate_batch_stream on a worker thread with its own DB session.
+    Every SSE event is handed to `emit`; stops early once `cancelled` is set.
+    Returns the session's final status for the admin broadcast.
+    """
+    db = SessionLocal()
+    session = None
+    try:
+        session = db.query(models.GenerationSession).filter(models.GenerationSession.id == session_pk).first()
+        user = db.query(models.User).filter(models.User.id == user_id).first()
+
+        stream = QuestionGenerator().generate_batch_stream(db=db, user=user, session=session, **generate_kwargs)
+        try:
+            for event in stream:
+                emit(event)
+                if cancelled.is_set():
+                    raise RuntimeError("Client disconnected")
+        finally:
+            stream.close()
+
+        # Mark session as completed
+        session.status = "completed"
+        session.completed_at = datetime.utcnow()
+        session.progress = 100
+        db.commit()
+
+        # If this was a task, mark it as completed
+        if task_id:
+            task = db.query(models.Task).filter(models.Task.id == task_id).first()
+            if task and task.assignee_id == user_id:
+                task.status = "completed"
+                task.completed_at = datetime.utcnow()
+                db.commit()
+
+        return {
+            "status": "completed",
+            "completed_at": session.completed_at.isoformat(),
+            "progress": 100
+        }
+
+    except Exception as e:
+        db.rollback()
+        if session is not None:
+            session.status = "failed"
+            session.error_message = str(e)
+            db.commit()
+        return {"status": "failed", "error_message": str(e)}
+    finally:
+        db.close()
+
+
+def _load_pdf_content(upload: SpooledUpload, topic: str, pages: Optional[List[int]] = None) -> Tuple[str, Optional[ExtractedDocument]]:
+    """
+    Topic-relevant text of an uploaded PDF ("" when it can't be read), and the document
+    itself when that text is all of it, so generation can reuse its chunks and embeddings.
+    """
+    try:
+        document = extract_document(upload.path, digest=upload.digest, pages=pages)
+    except Exception as e:
+        print(f"Error extracting text from PDF {upload.digest[:12]}: {e}")
+        return "", None
+    text = select_relevant_text(document, topic)
+    return text, document if text is document.text else None
+
+
+def _create_generation_session(db: Session, **fields) -> models.GenerationSession:
+    session = models.GenerationSession(**fields)
+    db.add(session)
+    db.commit()
+    db.refresh(session)
+    return session
+
+
+def _mark_session_failed(db: Session, session_pk: int, error: str) -> Optional[dict]:
+    db.rollback()
+    session = db.query(models.GenerationSession).filter(models.GenerationSession.id == session_pk).first()
+    if session is None:
+        return None
+    session.status = "failed"
+    session.error_message = error
+    db.commit()
+    return {"session_id": session.session_id, "user_id": session.user_id, "topic": session.topic}
+
+
+async def _fail_session(db: AsyncSession, session_pk: int, user_email: str, error: str):
+    """Mark a session that never reached its stream as failed, and tell admin clients."""
+    try:
+        failed = await db.run_sync(_mark_session_failed, session_pk, error)
+    except Exception as e:
+        print(f"Error marking session failed: {e}")
+        return
+    if failed:
+        await manager.broadcast_session_update({
+            **failed,
+            "user_email": user_email,
+            "status": "failed",
+            "error_message": error
+        })
+
+
+async def _resolve_upload_pages(upload: Optional[SpooledUpload], pages: Optional[str], sections: Optional[List[str]]) -> Optional[List[int]]:
+    """0-based pages of an uploaded PDF picked by `pages`/`sections`, or None for all of them."""
+    if not upload or upload.content_type != "application/pdf":
+        return None
+    try:
+        return await run_in_threadpool(resolve_page_selection, upload.path, pages, sections)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not read PDF: {e}")
+
+
+@app.post("/documents/outline")
+async def get_document_outline(
+    file: UploadFile = File(...),
+    current_user: auth.Principal = Depends(auth.get_current_user)
+):
+    """Page count and bookmark sections of a PDF, for choosing `pages`/`sections` in /generate"""
+    if file.content_type != "application/pdf":
+        raise HTTPException(status_code=400, detail="Outline is only available for PDF files")
+
+    with await spool_upload(file) as upload:
+        try:
+            page_count, outline = await run_in_threadpool(get_outline, upload.path)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Could not read PDF: {e}")
+
+    return {
+        "page_count": page_count,
+        "sections": [entry._asdict() for entry in outline]
+    }
+
+
 @app.post("/generate")
 async def generate_questions_endpoint(
     topic: str = Form(...),
@@ -251,13 +463,26 @@ async def generate_questions_endpoint(
     user_context: Optional[str] = Form(None),
     use_web_search: bool = Form(False),
     task_id: Optional[int] = Form(None),
+    pages: Optional[str] = Form(None),
+    sections: Optional[List[str]] = Form(None),
     file: Optional[UploadFile] = File(None),
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: auth.Principal = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
+    """
+    `pages` ("1-5, 8, 12-", 1-based) and/or `sections` (outline titles, repeatable) restrict
+    an uploaded PDF to those pages; only they are extracted. See /documents/outline.
+    """
+    # Spool the upload to disk (hashing as it streams) before any work is recorded for it
+    upload = await spool_upload(file) if file else None
+    session = None
+
     try:
+        selected_pages = await _resolve_upload_pages(upload, pages, sections)
+
         # Create a generation session
-        session = models.GenerationSession(
+        session = await db.run_sync(
+            _create_generation_session,
             user_id=current_user.id,
             topic=topic,
             num_questions=num_questions,
@@ -267,9 +492,6 @@ async def generate_questions_endpoint(
             status="active",
             task_id=task_id
         )
-        db.add(session)
-        db.commit()
-        db.refresh(session)
 
         # Broadcast new active session to admin clients
         await manager.broadcast_session_update({
@@ -287,139 +509,126 @@ async def generate_questions_endpoint(
         })
 
         file_content = ""
-        if file:
-            if file.content_type == "application/pdf":
-                file_bytes = await file.read()
-                file_content = extract_text_from_pdf(file_bytes)
-            elif file.content_type.startswith("text/"):
-                file_bytes = await file.read()
-                file_content = file_bytes.decode("utf-8")
+        document = None
+        if upload:
+            if upload.content_type == "application/pdf":
+                # PyMuPDF parsing is CPU-bound; keep it off the event loop.
+                # Repeat uploads of the same file are served from the extraction cache,
+                # and only the chunks relevant to the topic stay in memory for the stream.
+                file_content, document = await run_in_threadpool(_load_pdf_content, upload, topic, selected_pages)
+            elif upload.content_type.startswith("text/"):
+                file_content = await run_in_threadpool(upload.read_text)
         
-        full_content = ""
-        if content: full_content += content + "\n\n"
-        if file_content: full_content += file_content
+        full_content = "\n\n".join(part for part in (content, file_content) if part).strip()
+
+        generate_kwargs = dict(
+            topic=topic,
+            content=full_content or None,
+            num_questions=num_questions,
+            num_sets=num_sets,
+            difficulty=difficulty,
+            question_type=question_type,
+            user_context=user_context,
+            use_web_search=use_web_search,
+            document=document if full_content == file_content else None
+        )
+        session_pk = session.id
+        session_uuid = session.session_id
+        user_id = current_user.id
+        user_email = current_user.email
 
         async def event_generator():
+            # Send session_id first
+            yield f"data: {json.dumps({'type': 'session', 'session_id': session_uuid})}\n\n"
+
+            loop = asyncio.get_running_loop()
+            events: asyncio.Queue = asyncio.Queue()
+            cancelled = threading.Event()
+
+            def emit(event: str):
+                loop.call_soon_threadsafe(events.put_nowait, event)
+
+            pipeline = loop.run_in_executor(
+                generation_executor,
+                run_generation_pipeline,
+                session_pk, user_id, task_id, generate_kwargs, emit, cancelled
+            )
+            # Scheduled after every emit() from the worker, so it always arrives last
+            pipeline.add_done_callback(lambda _: events.put_nowait(_PIPELINE_DONE))
+
             try:
-                # Send session_id first
-                yield f"data: {json.dumps({'type': 'session', 'session_id': session.session_id})}\n\n"
-                
-                generator = QuestionGenerator()
-                for event in generator.generate_batch_stream(
-                    topic=topic,
-                    content=full_content.strip() if full_content.strip() else None,
-                    num_questions=num_questions,
-                    num_sets=num_sets,
-                    difficulty=difficulty,
-                    question_type=question_type,
-                    user_context=user_context,
-                    use_web_search=use_web_search,
-                    db=db,
-                    user=current_user,
-                    session=session
-                ):
+                while True:
+                    event = await events.get()
+                    if event is _PIPELINE_DONE:
+                        break
                     yield event
-                
-                # Mark session as completed
-                session.status = "completed"
-                session.completed_at = datetime.utcnow()
-                session.progress = 100
-                db.commit()
-                
-                # Broadcast completion to admin clients
-                await manager.broadcast_session_update({
-                    "session_id": session.session_id,
-                    "user_id": current_user.id,
-                    "user_email": current_user.email,
-                    "topic": topic,
-                    "status": "completed",
-                    "completed_at": session.completed_at.isoformat(),
-                    "progress": 100
-                })
-                
-                # If this was a task, mark it as completed
-                if task_id:
-                    task = db.query(models.Task).filter(models.Task.id == task_id).first()
-                    if task and task.assignee_id == current_user.id:
-                        task.status = "completed"
-                        task.completed_at = datetime.utcnow()
-                        db.commit()
-                
-            except Exception as e:
-                session.status = "failed"
-                session.error_message = str(e)
-                db.commit()
-                
-                # Broadcast failure to admin clients
-                await manager.broadcast_session_update({
-                    "session_id": session.session_id,
-                    "user_id": current_user.id,
-                    "user_email": current_user.email,
-                    "topic": topic,
-                    "status": "failed",
-                    "error_message": str(e)
-                })
-                raise
+            finally:
+                # Client went away (or we finished): tell the worker to stop early
+                cancelled.set()
+
+            outcome = await pipeline
+            
+            # Broadcast completion/failure to admin clients
+            await manager.broadcast_session_update({
+                "session_id": session_uuid,
+                "user_id": user_id,
+                "user_email": user_email,
+                "topic": topic,
+                **outcome
+            })
+
+            if outcome["status"] == "failed":
+                yield f"data: {json.dumps({'type': 'error', 'message': outcome['error_message']})}\n\n"
 
         return StreamingResponse(event_generator(), media_type="text/event-stream")
 
     except Exception as e:
+        # Nothing will finish a session whose stream never started
+        if session is not None:
+            await _fail_session(db, session.id, current_user.email, getattr(e, "detail", None) or str(e))
+        if isinstance(e, HTTPException):
+            raise
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if upload:
+            upload.close()
 
 @app.get("/history")
-def get_history(current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+async def get_history(
+    response: Response,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    summary: bool = False,
+    current_user: auth.Principal = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Get generation history grouped by session.
-    Returns list of generations where each generation contains all question sets from that session.
+    One page of generation history grouped by session, newest first.
+    The cursor for the next page is in X-Next-Cursor (absent on the last page).
+    With `summary`, sets come without questions (fetch them from /history/session/{id}).
     """
-    from sqlalchemy import func
-    
-    # Get all question sets for the user with questions eagerly loaded
-    all_sets = db.query(models.QuestionSet).filter(
-        models.QuestionSet.owner_id == current_user.id
-    ).order_by(models.QuestionSet.created_at.desc()).all()
-    
-    # Group by session_id
-    grouped = {}
-    for q_set in all_sets:
-        session_key = q_set.session_id if q_set.session_id else f"legacy_{q_set.id}"
-        
-        if session_key not in grouped:
-            grouped[session_key] = {
-                "session_id": q_set.session_id,
-                "topic": q_set.topic,
-                "difficulty": q_set.difficulty,
-                "question_type": q_set.question_type,
-                "created_at": q_set.created_at,
-                "total_questions": 0,
-                "num_sets": 0,
-                "question_sets": []
-            }
-        
-        # Convert to dict using schema to ensure questions are included
-        set_dict = schemas.QuestionSet.from_orm(q_set).dict()
-        grouped[session_key]["question_sets"].append(set_dict)
-        grouped[session_key]["total_questions"] += q_set.question_count
-        grouped[session_key]["num_sets"] += 1
-    
-    # Convert to list and sort by created_at
-    result = sorted(grouped.values(), key=lambda x: x["created_at"], reverse=True)
-    return result
+    try:
+        groups, next_cursor = await db.run_sync(history_page, current_user.id, limit=limit, cursor=cursor, summary=summary)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return groups
 
 @app.get("/history/{set_id}", response_model=schemas.QuestionSet)
-def get_question_set(set_id: int, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+def get_question_set(set_id: int, current_user: auth.Principal = Depends(auth.get_current_user), db: Session = Depends(get_db)):
     q_set = db.query(models.QuestionSet).filter(models.QuestionSet.id == set_id, models.QuestionSet.owner_id == current_user.id).first()
     if not q_set:
         raise HTTPException(status_code=404, detail="Question set not found")
     return q_set
 
 @app.get("/history/session/{session_id}")
-def get_generation_session(session_id: int, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+def get_generation_session(session_id: int, current_user: auth.Principal = Depends(auth.get_current_user), db: Session = Depends(get_db)):
     """Get all question sets from a generation session"""
     sets = db.query(models.QuestionSet).filter(
         models.QuestionSet.session_id == session_id,
         models.QuestionSet.owner_id == current_user.id
-    ).all()
+    ).options(selectinload(models.QuestionSet.questions)).all()
     
     if not sets:
         raise HTTPException(status_code=404, detail="Generation not found")
@@ -436,7 +645,7 @@ def get_generation_session(session_id: int, current_user: models.User = Depends(
     }
 
 @app.delete("/history/{set_id}")
-def delete_question_set(set_id: int, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+def delete_question_set(set_id: int, current_user: auth.Principal = Depends(auth.get_current_user), db: Session = Depends(get_db)):
     q_set = db.query(models.QuestionSet).filter(models.QuestionSet.id == set_id, models.QuestionSet.owner_id == current_user.id).first()
     if not q_set:
         raise HTTPException(status_code=404, detail="Question set not found")
@@ -448,7 +657,7 @@ def delete_question_set(set_id: int, current_user: models.User = Depends(auth.ge
 @app.post("/regenerate/{question_id}")
 def regenerate_single_question(
     question_id: int, 
-    current_user: models.User = Depends(auth.get_current_user), 
+    current_user: auth.Principal = Depends(auth.get_current_user), 
     db: Session = Depends(get_db)
 ):
 
@@ -467,7 +676,8 @@ def regenerate_single_question(
         num_questions=1,
         difficulty=q_set.difficulty,
         question_type=q_set.question_type,
-        user_context=f"Regenerate a better version of this question: {db_question.description}"
+        user_context=f"Regenerate a better version of this question: {db_question.description}",
+        user_id=current_user.id
     )
 
     if not new_questions:
@@ -479,7 +689,7 @@ def regenerate_single_question(
     validation_text = ""
     validated_data = None
     for chunk_text, result in validator.validate_question_batch_stream(
-        [new_q_data], q_set.topic, ""
+        [new_q_data], q_set.topic, "", user_id=current_user.id
     ):
         if chunk_text:
             validation_text += chunk_text
@@ -508,7 +718,7 @@ def regenerate_single_question(
 def export_set(
     set_id: int, 
     format: str = "json", 
-    current_user: models.User = Depends(auth.get_current_user), 
+    current_user: auth.Principal = Depends(auth.get_current_user), 
     db: Session = Depends(get_db)
 ):
     q_set = db.query(models.QuestionSet).filter(models.QuestionSet.id == set_id, models.QuestionSet.owner_id == current_user.id).first()
@@ -573,179 +783,86 @@ def export_set(
 # ==================== ADMIN DASHBOARD ENDPOINTS ====================
 
 @app.get("/admin/dashboard", response_model=schemas.AdminDashboardStats)
-def get_admin_dashboard(
-    current_user: models.User = Depends(auth.get_current_admin),
-    db: Session = Depends(get_db)
+async def get_admin_dashboard(
+    current_user: auth.Principal = Depends(auth.get_current_admin),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    total_users = db.query(models.User).count()
-    active_users = db.query(models.User).filter(models.User.is_active == True).count()
-    total_generations = db.query(models.QuestionSet).count()
-    total_questions = db.query(models.Question).count()
-    active_sessions = db.query(models.GenerationSession).filter(
-        models.GenerationSession.status == "active"
-    ).count()
-    pending_tasks = db.query(models.Task).filter(
-        models.Task.status == "pending"
-    ).count()
-    
+    values = await db.run_sync(counters.read_counters, counters.GLOBAL)
     return schemas.AdminDashboardStats(
-        total_users=total_users,
-        active_users=active_users,
-        total_generations=total_generations,
-        total_questions=total_questions,
-        active_sessions=active_sessions,
-        pending_tasks=pending_tasks
+        total_users=values.get("users", 0),
+        active_users=values.get("active_users", 0),
+        total_generations=values.get("question_sets", 0),
+        total_questions=values.get("questions", 0),
+        active_sessions=values.get("sessions:active", 0),
+        pending_tasks=values.get("tasks:pending", 0)
     )
 
 @app.get("/admin/users-with-stats", response_model=List[schemas.UserWithStats])
 def get_users_with_stats(
-    current_user: models.User = Depends(auth.get_current_admin),
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    sort_by: str = "id",
+    order: str = "asc",
+    current_user: auth.Principal = Depends(auth.get_current_admin),
     db: Session = Depends(get_db)
 ):
-    users = db.query(models.User).all()
-    result = []
-    for user in users:
-        total_generations = db.query(models.QuestionSet).filter(
-            models.QuestionSet.owner_id == user.id
-        ).count()
-        total_questions = db.query(models.Question).join(models.QuestionSet).filter(
-            models.QuestionSet.owner_id == user.id
-        ).count()
-        active_sessions = db.query(models.GenerationSession).filter(
-            models.GenerationSession.user_id == user.id,
-            models.GenerationSession.status == "active"
-        ).count()
-        pending_tasks = db.query(models.Task).filter(
-            models.Task.assignee_id == user.id,
-            models.Task.status == "pending"
-        ).count()
-        
-        result.append(schemas.UserWithStats(
-            id=user.id,
-            email=user.email,
-            is_active=user.is_active,
-            is_admin=user.is_admin,
-            created_at=user.created_at,
-            total_generations=total_generations,
-            total_questions=total_questions,
-            active_sessions=active_sessions,
-            pending_tasks=pending_tasks
-        ))
-    return result
+    """Users with their stats, paginated by skip/limit; the unpaginated count is in X-Total-Count."""
+    try:
+        total, users = users_with_stats(db, skip=skip, limit=limit, sort_by=sort_by, order=order)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response.headers["X-Total-Count"] = str(total)
+    return users
 
 @app.get("/admin/recent-generations", response_model=List[schemas.QuestionSetWithOwner])
 def get_all_recent_generations(
     limit: int = 20,
-    current_user: models.User = Depends(auth.get_current_admin),
+    current_user: auth.Principal = Depends(auth.get_current_admin),
     db: Session = Depends(get_db)
 ):
-    sets = db.query(models.QuestionSet).order_by(
+    sets = queries.question_sets_with_owner(db).order_by(
         models.QuestionSet.created_at.desc()
     ).limit(limit).all()
-    
-    result = []
-    for s in sets:
-        owner = db.query(models.User).filter(models.User.id == s.owner_id).first()
-        result.append(schemas.QuestionSetWithOwner(
-            id=s.id,
-            topic=s.topic,
-            difficulty=s.difficulty,
-            created_at=s.created_at,
-            updated_at=s.updated_at,
-            validation_text=s.validation_text,
-            question_count=s.question_count,
-            is_archived=s.is_archived,
-            session_id=s.session_id,
-            questions=[],  # Don't include questions in list view
-            owner_id=s.owner_id,
-            owner_email=owner.email if owner else "Unknown"
-        ))
-    return result
+    return [queries.set_with_owner(s) for s in sets]
 
 @app.get("/admin/history")
 def get_all_history(
-    current_user: models.User = Depends(auth.get_current_admin),
+    response: Response,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: auth.Principal = Depends(auth.get_current_admin),
     db: Session = Depends(get_db)
 ):
     """
-    Get all generation history grouped by session (admin only).
+    One page of all generation history grouped by session (admin only), newest first.
+    The cursor for the next page is in X-Next-Cursor (absent on the last page).
+    Sets are listed without questions; fetch one from /admin/history/{set_id}.
     """
-    # Get all question sets with owner info
-    all_sets = db.query(models.QuestionSet).order_by(
-        models.QuestionSet.created_at.desc()
-    ).all()
-    
-    # Group by session_id
-    grouped = {}
-    for q_set in all_sets:
-        owner = db.query(models.User).filter(models.User.id == q_set.owner_id).first()
-        session_key = q_set.session_id if q_set.session_id else f"legacy_{q_set.id}"
-        
-        if session_key not in grouped:
-            grouped[session_key] = {
-                "session_id": q_set.session_id,
-                "topic": q_set.topic,
-                "difficulty": q_set.difficulty,
-                "question_type": q_set.question_type if hasattr(q_set, 'question_type') else 'multiple_choice',
-                "created_at": q_set.created_at,
-                "total_questions": 0,
-                "num_sets": 0,
-                "owner_id": q_set.owner_id,
-                "owner_email": owner.email if owner else "Unknown",
-                "question_sets": []
-            }
-        
-        grouped[session_key]["question_sets"].append({
-            "id": q_set.id,
-            "topic": q_set.topic,
-            "difficulty": q_set.difficulty,
-            "question_type": q_set.question_type if hasattr(q_set, 'question_type') else 'multiple_choice',
-            "created_at": q_set.created_at,
-            "updated_at": q_set.updated_at,
-            "validation_text": q_set.validation_text,
-            "question_count": q_set.question_count,
-            "is_archived": q_set.is_archived,
-            "session_id": q_set.session_id,
-            "questions": []
-        })
-        grouped[session_key]["total_questions"] += q_set.question_count
-        grouped[session_key]["num_sets"] += 1
-    
-    # Convert to list and sort by created_at
-    result = sorted(grouped.values(), key=lambda x: x["created_at"], reverse=True)
-    return result
+    try:
+        groups, next_cursor = history_page(db, limit=limit, cursor=cursor, summary=True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return groups
 
 @app.get("/admin/history/{set_id}", response_model=schemas.QuestionSetWithOwner)
 def get_question_set_admin(
     set_id: int,
-    current_user: models.User = Depends(auth.get_current_admin),
+    current_user: auth.Principal = Depends(auth.get_current_admin),
     db: Session = Depends(get_db)
 ):
     """Get question set details for admin (any user's set)"""
-    q_set = db.query(models.QuestionSet).filter(models.QuestionSet.id == set_id).first()
+    q_set = queries.question_sets_with_owner(db, with_questions=True).filter(models.QuestionSet.id == set_id).first()
     if not q_set:
         raise HTTPException(status_code=404, detail="Question set not found")
-    
-    owner = db.query(models.User).filter(models.User.id == q_set.owner_id).first()
-    return schemas.QuestionSetWithOwner(
-        id=q_set.id,
-        topic=q_set.topic,
-        difficulty=q_set.difficulty,
-        created_at=q_set.created_at,
-        updated_at=q_set.updated_at,
-        validation_text=q_set.validation_text,
-        question_count=q_set.question_count,
-        is_archived=q_set.is_archived,
-        session_id=q_set.session_id,
-        questions=q_set.questions,
-        owner_id=q_set.owner_id,
-        owner_email=owner.email if owner else "Unknown"
-    )
+    return queries.set_with_owner(q_set)
 
 @app.delete("/admin/history/{set_id}")
 def delete_question_set_admin(
     set_id: int,
-    current_user: models.User = Depends(auth.get_current_admin),
+    current_user: auth.Principal = Depends(auth.get_current_admin),
     db: Session = Depends(get_db)
 ):
     """Delete any question set as admin"""
@@ -759,35 +876,34 @@ def delete_question_set_admin(
 
 @app.get("/admin/active-sessions", response_model=List[schemas.SessionWithUser])
 def get_active_sessions(
-    current_user: models.User = Depends(auth.get_current_admin),
+    current_user: auth.Principal = Depends(auth.get_current_admin),
     db: Session = Depends(get_db)
 ):
-    sessions = db.query(models.GenerationSession).filter(
+    sessions = queries.sessions_with_user(db).filter(
         models.GenerationSession.status == "active"
     ).order_by(models.GenerationSession.started_at.desc()).all()
-    
-    result = []
-    for s in sessions:
-        user = db.query(models.User).filter(models.User.id == s.user_id).first()
-        result.append(schemas.SessionWithUser(
-            id=s.id,
-            session_id=s.session_id,
-            user_id=s.user_id,
-            topic=s.topic,
-            num_questions=s.num_questions,
-            num_sets=s.num_sets,
-            difficulty=s.difficulty,
-            question_type=s.question_type,
-            status=s.status,
-            progress=s.progress,
-            current_step=s.current_step,
-            error_message=s.error_message,
-            started_at=s.started_at,
-            completed_at=s.completed_at,
-            task_id=s.task_id,
-            user_email=user.email if user else "Unknown"
-        ))
-    return result
+    return [queries.session_with_user(s) for s in sessions]
+
+@app.get("/admin/cache/stats")
+def get_cache_stats(current_user: auth.Principal = Depends(auth.get_current_admin)):
+    """Question and extraction cache hit/miss/eviction counters (aggregated across all workers), plus this worker's embedding store counters"""
+    from backend.core.local_ml import get_question_cache_stats
+    from backend.core.extraction_cache import get_extraction_cache
+    from backend.core.embedding_store import get_embedding_store
+    return {
+        "questions": get_question_cache_stats(),
+        "documents": get_extraction_cache().stats(),
+        "embeddings": get_embedding_store().stats()
+    }
+
+@app.delete("/admin/cache")
+def clear_caches(current_user: auth.Principal = Depends(auth.get_current_admin)):
+    """Drop every cached question set and extracted document"""
+    from backend.core.question_cache import get_question_cache
+    from backend.core.extraction_cache import get_extraction_cache
+    removed_sets = get_question_cache().clear()
+    removed_documents = get_extraction_cache().clear()
+    return {"message": f"Removed {removed_sets} cached question sets and {removed_documents} extracted documents"}
 
 
 # ==================== TASK ENDPOINTS ====================
@@ -795,7 +911,7 @@ def get_active_sessions(
 @app.post("/tasks", response_model=schemas.Task)
 def create_task(
     task: schemas.TaskCreate,
-    current_user: models.User = Depends(auth.get_current_admin),
+    current_user: auth.Principal = Depends(auth.get_current_admin),
     db: Session = Depends(get_db)
 ):
     # Verify assignee exists
@@ -824,57 +940,36 @@ def create_task(
 @app.get("/tasks", response_model=List[schemas.TaskWithUsers])
 def get_all_tasks(
     status: Optional[str] = None,
-    current_user: models.User = Depends(auth.get_current_admin),
+    current_user: auth.Principal = Depends(auth.get_current_admin),
     db: Session = Depends(get_db)
 ):
-    query = db.query(models.Task)
+    query = queries.tasks_with_users(db)
     if status:
         query = query.filter(models.Task.status == status)
     tasks = query.order_by(models.Task.created_at.desc()).all()
-    
-    result = []
-    for t in tasks:
-        assignee = db.query(models.User).filter(models.User.id == t.assignee_id).first()
-        creator = db.query(models.User).filter(models.User.id == t.created_by_id).first()
-        result.append(schemas.TaskWithUsers(
-            id=t.id,
-            title=t.title,
-            description=t.description,
-            topic=t.topic,
-            num_questions=t.num_questions,
-            num_sets=t.num_sets,
-            difficulty=t.difficulty,
-            question_type=t.question_type,
-            user_context=t.user_context,
-            due_date=t.due_date,
-            status=t.status,
-            assignee_id=t.assignee_id,
-            created_by_id=t.created_by_id,
-            created_at=t.created_at,
-            completed_at=t.completed_at,
-            assignee_email=assignee.email if assignee else "Unknown",
-            created_by_email=creator.email if creator else "Unknown"
-        ))
-    return result
+    return [queries.task_with_users(t) for t in tasks]
 
-@app.get("/tasks/my", response_model=List[schemas.Task])
-def get_my_tasks(
-    status: Optional[str] = None,
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
-):
-    query = db.query(models.Task).filter(models.Task.assignee_id == current_user.id)
+def _assigned_tasks(db: Session, user_id: int, status: Optional[str]) -> List[models.Task]:
+    query = db.query(models.Task).filter(models.Task.assignee_id == user_id)
     if status:
         query = query.filter(models.Task.status == status)
     return query.order_by(models.Task.created_at.desc()).all()
 
+@app.get("/tasks/my", response_model=List[schemas.Task])
+async def get_my_tasks(
+    status: Optional[str] = None,
+    current_user: auth.Principal = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await db.run_sync(_assigned_tasks, current_user.id, status)
+
 @app.get("/tasks/{task_id}", response_model=schemas.TaskWithUsers)
 def get_task(
     task_id: int,
-    current_user: models.User = Depends(auth.get_current_user),
+    current_user: auth.Principal = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
-    task = db.query(models.Task).filter(models.Task.id == task_id).first()
+    task = queries.tasks_with_users(db).filter(models.Task.id == task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
@@ -883,34 +978,13 @@ def get_task(
     if task.assignee_id != current_user.id and current_user.email != admin_email:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    assignee = db.query(models.User).filter(models.User.id == task.assignee_id).first()
-    creator = db.query(models.User).filter(models.User.id == task.created_by_id).first()
-    
-    return schemas.TaskWithUsers(
-        id=task.id,
-        title=task.title,
-        description=task.description,
-        topic=task.topic,
-        num_questions=task.num_questions,
-        num_sets=task.num_sets,
-        difficulty=task.difficulty,
-        question_type=task.question_type,
-        user_context=task.user_context,
-        due_date=task.due_date,
-        status=task.status,
-        assignee_id=task.assignee_id,
-        created_by_id=task.created_by_id,
-        created_at=task.created_at,
-        completed_at=task.completed_at,
-        assignee_email=assignee.email if assignee else "Unknown",
-        created_by_email=creator.email if creator else "Unknown"
-    )
+    return queries.task_with_users(task)
 
 @app.put("/tasks/{task_id}", response_model=schemas.Task)
 def update_task(
     task_id: int,
     task_update: schemas.TaskUpdate,
-    current_user: models.User = Depends(auth.get_current_admin),
+    current_user: auth.Principal = Depends(auth.get_current_admin),
     db: Session = Depends(get_db)
 ):
     task = db.query(models.Task).filter(models.Task.id == task_id).first()
@@ -928,7 +1002,7 @@ def update_task(
 @app.delete("/tasks/{task_id}")
 def delete_task(
     task_id: int,
-    current_user: models.User = Depends(auth.get_current_admin),
+    current_user: auth.Principal = Depends(auth.get_current_admin),
     db: Session = Depends(get_db)
 ):
     task = db.query(models.Task).filter(models.Task.id == task_id).first()
@@ -942,28 +1016,34 @@ def delete_task(
 
 # ==================== SESSION ENDPOINTS ====================
 
-@app.get("/sessions", response_model=List[schemas.Session])
-def get_my_sessions(
-    status: Optional[str] = None,
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
-):
+def _user_sessions(db: Session, user_id: int, status: Optional[str]) -> List[models.GenerationSession]:
     query = db.query(models.GenerationSession).filter(
-        models.GenerationSession.user_id == current_user.id
+        models.GenerationSession.user_id == user_id
     )
     if status:
         query = query.filter(models.GenerationSession.status == status)
     return query.order_by(models.GenerationSession.started_at.desc()).all()
 
+def _find_session(db: Session, session_id: str) -> Optional[models.GenerationSession]:
+    return db.query(models.GenerationSession).filter(
+        models.GenerationSession.session_id == session_id
+    ).first()
+
+@app.get("/sessions", response_model=List[schemas.Session])
+async def get_my_sessions(
+    status: Optional[str] = None,
+    current_user: auth.Principal = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await db.run_sync(_user_sessions, current_user.id, status)
+
 @app.get("/sessions/{session_id}", response_model=schemas.Session)
-def get_session(
+async def get_session(
     session_id: str,
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: auth.Principal = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    session = db.query(models.GenerationSession).filter(
-        models.GenerationSession.session_id == session_id
-    ).first()
+    session = await db.run_sync(_find_session, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
@@ -978,30 +1058,16 @@ def get_session(
 # ==================== USER DASHBOARD ENDPOINT ====================
 
 @app.get("/user/dashboard", response_model=schemas.UserDashboardStats)
-def get_user_dashboard(
-    current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+async def get_user_dashboard(
+    current_user: auth.Principal = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    total_generations = db.query(models.QuestionSet).filter(
-        models.QuestionSet.owner_id == current_user.id
-    ).count()
-    total_questions = db.query(models.Question).join(models.QuestionSet).filter(
-        models.QuestionSet.owner_id == current_user.id
-    ).count()
-    pending_tasks = db.query(models.Task).filter(
-        models.Task.assignee_id == current_user.id,
-        models.Task.status == "pending"
-    ).count()
-    completed_tasks = db.query(models.Task).filter(
-        models.Task.assignee_id == current_user.id,
-        models.Task.status == "completed"
-    ).count()
-    
+    values = await db.run_sync(counters.read_counters, counters.USER, current_user.id)
     return schemas.UserDashboardStats(
-        total_generations=total_generations,
-        total_questions=total_questions,
-        pending_tasks=pending_tasks,
-        completed_tasks=completed_tasks
+        total_generations=values.get("question_sets", 0),
+        total_questions=values.get("questions", 0),
+        pending_tasks=values.get("tasks:pending", 0),
+        completed_tasks=values.get("tasks:completed", 0)
     )
 
 # ==================== STATIC FILE SERVING ====================
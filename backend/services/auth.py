@@ -1,11 +1,17 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from backend.core.database import get_db
+from backend.core.database import get_async_db
 from backend.core import models
 import os
 
@@ -14,14 +20,110 @@ SECRET_KEY = os.getenv("SECRET_KEY", "09d25e094faa6ca2556c818166b7a9563b93f7099f
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 3000
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+# Argon2 cost parameters (passlib defaults). Stored hashes made with other parameters are
+# rehashed on the user's next successful login.
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__rounds=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST,
+    argon2__parallelism=ARGON2_PARALLELISM
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# Authenticated users are cached per token subject for this long. Changes made through this
+# process invalidate the entry at once; other workers pick them up within the TTL.
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "30"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+
+
+class Principal:
+    """Read-only snapshot of the authenticated user's row, safe to share between requests."""
+    __slots__ = ("id", "email", "is_active", "is_admin", "created_at")
+
+    def __init__(self, user: models.User):
+        for field in self.__slots__:
+            object.__setattr__(self, field, getattr(user, field))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Principal is read-only")
+
+
+_principals: "OrderedDict[str, Tuple[float, Principal]]" = OrderedDict()
+_principals_lock = threading.Lock()
+
+
+def _cached_principal(email: str) -> Optional[Principal]:
+    with _principals_lock:
+        entry = _principals.get(email)
+        if entry is None:
+            return None
+        expires_at, principal = entry
+        if expires_at < time.monotonic():
+            del _principals[email]
+            return None
+        _principals.move_to_end(email)
+        return principal
+
+
+def _cache_principal(principal: Principal):
+    with _principals_lock:
+        _principals[principal.email] = (time.monotonic() + AUTH_CACHE_TTL_SECONDS, principal)
+        _principals.move_to_end(principal.email)
+        while len(_principals) > AUTH_CACHE_MAX_ENTRIES:
+            _principals.popitem(last=False)
+
+
+def invalidate_principal(email: Optional[str] = None):
+    """Drop the cached user for `email` (every cached user when None) after changing it."""
+    with _principals_lock:
+        if email is None:
+            _principals.clear()
+        else:
+            _principals.pop(email, None)
+
+# Password hashing runs on its own pool (argon2 releases the GIL, so it scales with cores)
+# so a login storm can't take over the threads other endpoints run on. Beyond
+# HASH_WORKERS running and HASH_MAX_PENDING queued, requests are turned away with 503.
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 1)))
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", "64"))
+HASH_RETRY_AFTER_SECONDS = int(os.getenv("HASH_RETRY_AFTER_SECONDS", "2"))
+
+_hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="pwhash")
+_hash_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_MAX_PENDING)
+
+def _submit_hash_job(fn: Callable, *args) -> Future:
+    if not _hash_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many sign-in requests, please retry shortly",
+            headers={"Retry-After": str(HASH_RETRY_AFTER_SECONDS)},
+        )
+    try:
+        future = _hash_executor.submit(fn, *args)
+    except BaseException:
+        _hash_slots.release()
+        raise
+    future.add_done_callback(lambda _: _hash_slots.release())
+    return future
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return _submit_hash_job(pwd_context.hash, password).result()
+
+async def verify_and_update_password(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    """
+    (verified, new_hash) without blocking the event loop; new_hash is set when the stored
+    hash uses outdated argon2 parameters and should be replaced.
+    """
+    future = _submit_hash_job(pwd_context.verify_and_update, plain_password, hashed_password)
+    return await asyncio.wrap_future(future)
+
+async def hash_password(password) -> str:
+    return await asyncio.wrap_future(_submit_hash_job(pwd_context.hash, password))
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -33,7 +135,10 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def _find_user(db: Session, email: str) -> Optional[models.User]:
+    return db.query(models.User).filter(models.User.email == email).first()
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -47,9 +152,14 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
     
-    user = db.query(models.User).filter(models.User.email == email).first()
+    user = _cached_principal(email) if AUTH_CACHE_TTL_SECONDS > 0 else None
     if user is None:
-        raise credentials_exception
+        db_user = await db.run_sync(_find_user, email)
+        if db_user is None:
+            raise credentials_exception
+        user = Principal(db_user)
+        if AUTH_CACHE_TTL_SECONDS > 0:
+            _cache_principal(user)
     
     # Check if user is active
     if not user.is_active:
@@ -57,7 +167,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         
     return user
 
-async def get_current_admin(current_user: models.User = Depends(get_current_user)):
+async def get_current_admin(current_user: Principal = Depends(get_current_user)):
     admin_email = os.getenv("ADMIN_EMAIL", "admin@example.com")
     if current_user.email != admin_email:
         raise HTTPException(
@@ -0,0 +1,243 @@
+"""
+Dashboard counters - row counts kept in the stat_counters table so dashboards read a
+handful of rows instead of counting the largest tables on every load.
+
+Counters are updated in the same transaction as the write that changes them: ORM writes
+through an after_flush listener, Core bulk inserts (question_sets.save_question_set) by
+calling apply_deltas() themselves. Writes that bypass both (bulk deletes, database
+cascades, manual SQL) are corrected by reconcile_counters(), which the app runs at startup
+and every COUNTER_RECONCILE_SECONDS.
+
+Names: users, active_users, question_sets, questions, sessions:<status>, tasks:<status>.
+All but the user counters also exist per user (sessions by user, tasks by assignee).
+"""
+
+import os
+import logging
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import event, func, inspect, select, update, insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from backend.core import models
+
+logger = logging.getLogger(__name__)
+
+COUNTER_RECONCILE_SECONDS = int(os.getenv("COUNTER_RECONCILE_SECONDS", "3600"))
+
+GLOBAL = "global"
+USER = "user"
+
+_table = models.StatCounter.__table__
+
+Deltas = Counter  # (scope, owner_id, name) -> change
+
+
+def _bump(deltas: Deltas, name: str, owner_id: Optional[int], delta: int):
+    deltas[(GLOBAL, 0, name)] += delta
+    if owner_id is not None:
+        deltas[(USER, owner_id, name)] += delta
+
+
+def _history(obj, attr: str) -> Tuple[bool, object, object]:
+    """(changed, old, new) of a flushed attribute."""
+    history = inspect(obj).attrs[attr].history
+    if not history.has_changes():
+        return False, None, None
+    old = history.deleted[0] if history.deleted else None
+    new = history.added[0] if history.added else None
+    return True, old, new
+
+
+def _set_owners(session: Session, connection: Connection, set_ids: Iterable[int]) -> Dict[int, int]:
+    """owner_id per question set id, from the session where possible, else one query."""
+    owners = {}
+    for obj in list(session.identity_map.values()) + list(session.new) + list(session.deleted):
+        if isinstance(obj, models.QuestionSet) and obj.id is not None:
+            owners[obj.id] = obj.owner_id
+    missing = {set_id for set_id in set_ids if set_id is not None and set_id not in owners}
+    if missing:
+        rows = connection.execute(
+            select(models.QuestionSet.id, models.QuestionSet.owner_id).where(models.QuestionSet.id.in_(missing))
+        )
+        owners.update(dict(rows.all()))
+    return owners
+
+
+def _count_row(deltas: Deltas, obj, sign: int, set_owners: Dict[int, int]):
+    if isinstance(obj, models.User):
+        _bump(deltas, "users", None, sign)
+        if obj.is_active:
+            _bump(deltas, "active_users", None, sign)
+    elif isinstance(obj, models.QuestionSet):
+        _bump(deltas, "question_sets", obj.owner_id, sign)
+    elif isinstance(obj, models.Question):
+        _bump(deltas, "questions", set_owners.get(obj.question_set_id), sign)
+    elif isinstance(obj, models.GenerationSession):
+        _bump(deltas, f"sessions:{obj.status}", obj.user_id, sign)
+    elif isinstance(obj, models.Task):
+        _bump(deltas, f"tasks:{obj.status}", obj.assignee_id, sign)
+
+
+def _count_change(deltas: Deltas, obj):
+    if isinstance(obj, models.User):
+        changed, old, new = _history(obj, "is_active")
+        if changed and bool(old) != bool(new):
+            _bump(deltas, "active_users", None, 1 if new else -1)
+    elif isinstance(obj, models.GenerationSession):
+        changed, old, new = _history(obj, "status")
+        if changed:
+            _bump(deltas, f"sessions:{old}", obj.user_id, -1)
+            _bump(deltas, f"sessions:{new}", obj.user_id, 1)
+    elif isinstance(obj, models.Task):
+        changed, old, new = _history(obj, "status")
+        if changed:
+            _bump(deltas, f"tasks:{old}", obj.assignee_id, -1)
+            _bump(deltas, f"tasks:{new}", obj.assignee_id, 1)
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+# Have the ORM load the previous value of tracked attributes on expired objects when they
+# are set, so after_flush can see which counter a row moved out of
+for _attribute in (models.User.is_active, models.GenerationSession.status, models.Task.status):
+    event.listen(_attribute, "set", _load_old_value, active_history=True)
+
+
+@event.listens_for(Session, "after_flush")
+def _after_flush(session: Session, flush_context):
+    touched = list(session.new) + list(session.deleted) + list(session.dirty)
+    if not any(isinstance(obj, (models.User, models.QuestionSet, models.Question, models.GenerationSession, models.Task)) for obj in touched):
+        return
+
+    connection = session.connection()
+    try:
+        # A savepoint, so a failed counter statement rolls back only itself (on Postgres an
+        # error otherwise aborts the whole transaction and the user's commit with it)
+        with connection.begin_nested():
+            question_set_ids = [
+                obj.question_set_id for obj in list(session.new) + list(session.deleted)
+                if isinstance(obj, models.Question)
+            ]
+            set_owners = _set_owners(session, connection, question_set_ids) if question_set_ids else {}
+
+            deltas: Deltas = Counter()
+            for obj in session.new:
+                _count_row(deltas, obj, 1, set_owners)
+            for obj in session.deleted:
+                _count_row(deltas, obj, -1, set_owners)
+                if isinstance(obj, models.User):
+                    connection.execute(_table.delete().where(_table.c.scope == USER, _table.c.owner_id == obj.id))
+            for obj in session.dirty:
+                if obj not in session.deleted:
+                    _count_change(deltas, obj)
+
+            apply_deltas(connection, deltas)
+    except Exception as e:
+        # Only the counter savepoint was rolled back; reconciliation fixes the drift
+        logger.error(f"Error updating counters: {e}")
+
+
+def _upsert(dialect_name: str):
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    stmt = dialect_insert(_table)
+    return stmt.on_conflict_do_update(
+        index_elements=[_table.c.scope, _table.c.owner_id, _table.c.name],
+        set_={"value": _table.c.value + stmt.excluded.value}
+    )
+
+
+def apply_deltas(connection, deltas: Deltas):
+    """Add `deltas` to the stored counters on `connection` (a Connection or Session), in its transaction."""
+    rows = [
+        {"scope": scope, "owner_id": owner_id, "name": name, "value": delta}
+        for (scope, owner_id, name), delta in deltas.items() if delta
+    ]
+    if not rows:
+        return
+
+    dialect_name = connection.get_bind().dialect.name if isinstance(connection, Session) else connection.dialect.name
+    stmt = _upsert(dialect_name)
+    if stmt is not None:
+        connection.execute(stmt, rows)
+        return
+
+    for row in rows:
+        result = connection.execute(
+            update(_table)
+            .where(_table.c.scope == row["scope"], _table.c.owner_id == row["owner_id"], _table.c.name == row["name"])
+            .values(value=_table.c.value + row["value"])
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(_table), row)
+
+
+def question_set_deltas(owner_id: int, question_count: int) -> Deltas:
+    deltas: Deltas = Counter()
+    _bump(deltas, "question_sets", owner_id, 1)
+    _bump(deltas, "questions", owner_id, question_count)
+    return deltas
+
+
+def read_counters(db: Session, scope: str = GLOBAL, owner_id: int = 0) -> Dict[str, int]:
+    """All counters of one scope/owner, in one primary-key range query."""
+    rows = db.execute(
+        select(_table.c.name, _table.c.value).where(_table.c.scope == scope, _table.c.owner_id == owner_id)
+    )
+    return dict(rows.all())
+
+
+def _grouped(db: Session, key, owner, *filters) -> Iterable[Tuple[object, Optional[int], int]]:
+    query = db.query(key, owner, func.count()).filter(*filters).group_by(key, owner)
+    return query.all()
+
+
+def reconcile_counters(db: Session) -> int:
+    """Recount every counter from the tables and replace the stored values. Returns the row count."""
+    deltas: Deltas = Counter()
+
+    try:
+        # Clear first so that (on SQLite) the write lock is held while counting
+        db.execute(_table.delete())
+
+        total_users, active_users = db.query(
+            func.count(models.User.id),
+            func.count(models.User.id).filter(models.User.is_active == True)
+        ).one()
+        _bump(deltas, "users", None, total_users)
+        _bump(deltas, "active_users", None, active_users)
+
+        for owner_id, count in db.query(models.QuestionSet.owner_id, func.count()).group_by(models.QuestionSet.owner_id):
+            _bump(deltas, "question_sets", owner_id, count)
+        for owner_id, count in db.query(models.QuestionSet.owner_id, func.count(models.Question.id)).join(
+            models.Question, models.Question.question_set_id == models.QuestionSet.id
+        ).group_by(models.QuestionSet.owner_id):
+            _bump(deltas, "questions", owner_id, count)
+        # Questions whose set is gone still count globally
+        orphans = db.query(func.count(models.Question.id)).outerjoin(
+            models.QuestionSet, models.Question.question_set_id == models.QuestionSet.id
+        ).filter(models.QuestionSet.id == None).scalar()
+        _bump(deltas, "questions", None, orphans)
+
+        for status, owner_id, count in _grouped(db, models.GenerationSession.status, models.GenerationSession.user_id):
+            _bump(deltas, f"sessions:{status}", owner_id, count)
+        for status, owner_id, count in _grouped(db, models.Task.status, models.Task.assignee_id):
+            _bump(deltas, f"tasks:{status}", owner_id, count)
+
+        apply_deltas(db, deltas)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    logger.info(f"Reconciled {len(deltas)} counters")
+    return len(deltas)
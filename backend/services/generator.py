@@ -1,17 +1,22 @@
+import os
 import json
+import queue
 import logging
-from typing import List, Optional, Generator, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Generator, Any, Callable, Tuple
 from sqlalchemy.orm import Session
 import backend.core.llm as llm
 from backend.services.validator import QuestionValidator
-from backend.core.models import QuestionSet, Question, User, GenerationSession
+from backend.core.models import User, GenerationSession
+from backend.core.extraction_cache import ExtractedDocument
+from backend.services.question_sets import save_question_set
+from backend.core.retrieval import plan_content
 from backend.core.local_ml import (
     remove_duplicate_questions,
     get_cached_questions,
     cache_questions,
     find_similar_cached_questions,
-    chunk_content,
-    get_most_relevant_chunk,
     is_local_ml_available
 )
 
@@ -19,6 +24,15 @@ from backend.core.local_ml import (
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Number of sets generate_batch_stream works on at the same time
+GENERATION_CONCURRENCY = max(1, int(os.getenv("GENERATION_CONCURRENCY", "3")))
+
+# Part of the question cache key: bump when the generation prompts change so old entries stop matching
+PROMPT_VERSION = "1"
+
+# Marker queued by a worker once a set has nothing more to emit
+_SET_DONE = object()
+
 class QuestionGenerator:
     def __init__(self):
         """
@@ -35,28 +49,35 @@ class QuestionGenerator:
         question_type: str = "multiple_choice",
         user_context: Optional[str] = None,
         use_cache: bool = True,
-        use_web_search: bool = False
+        use_web_search: bool = False,
+        user_id: Optional[int] = None
     ) -> List[dict]:
         """
         Generates questions based on a topic or provided content.
         Chunks requests if num_questions > 25.
         Uses local ML for caching, deduplication, and content optimization.
         Supports grounding with Google Search when use_web_search=True.
+        LLM calls count against `user_id`'s share of the concurrency limit.
         """
+        cache_key_params = {
+            "num_questions": num_questions,
+            "user_context": user_context,
+            "model_name": llm.model.model_name,
+            "prompt_version": PROMPT_VERSION
+        }
+
         # Try to get cached questions first (reduces API calls)
         if use_cache and is_local_ml_available() and not use_web_search:
-            cached = get_cached_questions(topic, content or "", difficulty, question_type)
+            cached = get_cached_questions(topic, content or "", difficulty, question_type, **cache_key_params)
             if cached and len(cached) >= num_questions:
                 logger.info(f"Returning {num_questions} questions from cache")
                 return remove_duplicate_questions(cached[:num_questions])
         
-        # Optimize content for API call (send only relevant chunks)
-        optimized_content = content
-        if content and is_local_ml_available() and len(content) > 3000:
-            chunks = chunk_content(content, max_chunk_size=2500)
-            if len(chunks) > 1:
-                optimized_content = get_most_relevant_chunk(chunks, topic)
-                logger.info(f"Optimized content from {len(content)} to {len(optimized_content)} chars")
+        # Optimize content for API call (send only the top-ranked chunks that fit the token budget)
+        plan = plan_content(content, topic)
+        optimized_content = plan.context_for_set(0) if plan else content
+        if content and optimized_content != content:
+            logger.info(f"Optimized content from {len(content)} to {len(optimized_content)} chars")
         
         all_questions = []
         chunk_size = 25
@@ -67,7 +88,7 @@ class QuestionGenerator:
             logger.info(f"Generating chunk of {current_batch_size} questions (Remaining: {remaining})")
             
             batch_questions = self._generate_single_batch(
-                topic, optimized_content, current_batch_size, difficulty, question_type, user_context, use_web_search
+                topic, optimized_content, current_batch_size, difficulty, question_type, user_context, use_web_search, user_id
             )
             
             if batch_questions:
@@ -88,7 +109,7 @@ class QuestionGenerator:
             
             # Cache for future use
             if all_questions:
-                cache_questions(all_questions, topic, content or "", difficulty, question_type)
+                cache_questions(all_questions, topic, content or "", difficulty, question_type, **cache_key_params)
         
         return all_questions
 
@@ -100,7 +121,8 @@ class QuestionGenerator:
         difficulty: str,
         question_type: str,
         user_context: Optional[str],
-        use_web_search: bool = False
+        use_web_search: bool = False,
+        user_id: Optional[int] = None
     ) -> List[dict]:
         logger.info(f"Generating {num_questions} {difficulty} {question_type} questions for topic: '{topic}'" + 
                    (" (with web search)" if use_web_search else ""))
@@ -145,7 +167,8 @@ class QuestionGenerator:
             response = llm.model.generate_content(
                 prompt,
                 generation_config=generation_config,
-                use_web_search=use_web_search
+                use_web_search=use_web_search,
+                user_id=user_id
             )
             
             if not response.text:
@@ -176,55 +199,31 @@ class QuestionGenerator:
             logger.error(f"Error generating questions: {e}")
             return []
 
-    def generate_batch_stream(
+    def _build_batch_prompt(
         self,
-        num_sets: int,
         topic: str,
-        content: Optional[str] = None,
-        num_questions: int = 5,
-        difficulty: str = "medium",
-        question_type: str = "multiple_choice",
-        user_context: Optional[str] = None,
-        use_web_search: bool = False,
-        db: Session = None,
-        user: User = None,
-        session: GenerationSession = None
-    ) -> Generator[str, None, None]:
+        content: Optional[str],
+        num_questions: int,
+        difficulty: str,
+        question_type: str,
+        user_context: Optional[str],
+        use_web_search: bool = False
+    ) -> str:
         """
-        Generates multiple sets (question banks) of questions, yielding progress updates and results.
-        Yields JSON strings formatted as Server-Sent Events (SSE).
-        Saves results to DB if db and user are provided.
-        Updates session progress if session is provided.
-        Supports grounding with Google Search when use_web_search=True.
+        Builds the generation prompt used for each set in generate_batch_stream.
         """
-        yield f"data: {json.dumps({'type': 'start', 'total_sets': num_sets})}\n\n"
-
-        for i in range(num_sets):
-            current_set = i + 1
-            
-            # Update session progress
-            if session and db:
-                progress = int((i / num_sets) * 100)
-                session.progress = progress
-                session.current_step = f"Generating set {current_set}/{num_sets}"
-                db.commit()
-            
-            # 1. Generate with streaming
-            yield f"data: {json.dumps({'type': 'progress', 'message': f'Generating set {current_set}/{num_sets}...', 'step': 'generating', 'set_index': current_set})}\n\n"
-            
-            # Stream the actual LLM response
-            context_instruction = ""
-            if content:
-                context_instruction = f"Base your questions STRICTLY on the following content:\n---\n{content}\n---\n"
-            else:
-                search_hint = " You can use current web information." if use_web_search else ""
-                context_instruction = f"Generate questions based on general knowledge of the topic: '{topic}'.{search_hint}"
+        context_instruction = ""
+        if content:
+            context_instruction = f"Base your questions STRICTLY on the following content:\n---\n{content}\n---\n"
+        else:
+            search_hint = " You can use current web information." if use_web_search else ""
+            context_instruction = f"Generate questions based on general knowledge of the topic: '{topic}'.{search_hint}"
 
-            user_instruction = ""
-            if user_context:
-                user_instruction = f"User Specific Instructions:\n{user_context}\n"
+        user_instruction = ""
+        if user_context:
+            user_instruction = f"User Specific Instructions:\n{user_context}\n"
 
-            prompt = f"""
+        return f"""
             You are an expert educational content generator.
             Task: Create a question bank.
 
@@ -247,102 +246,265 @@ class QuestionGenerator:
             8. IMPORTANT: Return EXACTLY {num_questions} questions in the array.
             """
 
+    def _stream_single_set(
+        self,
+        current_set: int,
+        num_sets: int,
+        topic: str,
+        content: Optional[str],
+        num_questions: int,
+        difficulty: str,
+        question_type: str,
+        user_context: Optional[str],
+        use_web_search: bool = False,
+        user_id: Optional[int] = None
+    ) -> Generator[Tuple[Optional[str], Optional[Tuple[List[dict], str]]], None, None]:
+        """
+        Generates and validates a single set without touching the database.
+        Yields (sse_event, None) while streaming, then (None, (questions, validation_text))
+        once the set is ready. Nothing is yielded as a result if generation failed.
+        Safe to run from a worker thread.
+        """
+        # 1. Generate with streaming
+        yield f"data: {json.dumps({'type': 'progress', 'message': f'Generating set {current_set}/{num_sets}...', 'step': 'generating', 'set_index': current_set})}\n\n", None
+
+        prompt = self._build_batch_prompt(
+            topic, content, num_questions, difficulty, question_type, user_context, use_web_search
+        )
+
+        try:
+            generation_config = llm.get_generation_config_json(llm.questions_schema)
+            
+            # Use streaming response
+            response = llm.model.generate_content(
+                prompt,
+                generation_config=generation_config,
+                stream=True,
+                use_web_search=use_web_search,
+                user_id=user_id
+            )
+            
+            full_text = ""
+            for chunk in response:
+                if chunk.text:
+                    full_text += chunk.text
+                    # Stream the thinking text to frontend
+                    yield f"data: {json.dumps({'type': 'thinking', 'text': chunk.text, 'set_index': current_set})}\n\n", None
+            
+            if not full_text:
+                yield f"data: {json.dumps({'type': 'error', 'message': f'Failed to generate questions for set {current_set}', 'set_index': current_set})}\n\n", None
+                return
+
+            questions = json.loads(full_text)
+            
+            # Ensure we have exactly the requested number
+            if isinstance(questions, list):
+                if len(questions) > num_questions:
+                    logger.warning(f"Set {current_set}: LLM returned {len(questions)} questions, truncating to {num_questions}")
+                    questions = questions[:num_questions]
+                elif len(questions) < num_questions:
+                    logger.warning(f"Set {current_set}: LLM returned only {len(questions)} questions instead of {num_questions}")
+            
+        except Exception as e:
+            logger.error(f"Error generating questions: {e}")
+            yield f"data: {json.dumps({'type': 'error', 'message': f'Failed to generate questions for set {current_set}: {str(e)}', 'set_index': current_set})}\n\n", None
+            return
+
+        # 2. Validate
+        yield f"data: {json.dumps({'type': 'progress', 'message': f'Validating set {current_set}/{num_sets}...', 'step': 'validating', 'set_index': current_set})}\n\n", None
+
+        validated_questions = None
+        validation_text = ""
+        for chunk_text, result in self.validator.validate_question_batch_stream(
+            questions, topic, content if content else "", user_id=user_id
+        ):
+            if chunk_text:
+                # Stream validation thinking
+                validation_text += chunk_text
+                yield f"data: {json.dumps({'type': 'validating', 'text': chunk_text, 'set_index': current_set})}\n\n", None
+            if result is not None:
+                validated_questions = result
+
+        if validated_questions is None:
+            validated_questions = questions
+
+        yield None, (validated_questions, validation_text)
+
+    def _save_set(
+        self,
+        current_set: int,
+        validated_questions: List[dict],
+        validation_text: str,
+        topic: str,
+        difficulty: str,
+        question_type: str,
+        db: Optional[Session],
+        user: Optional[User],
+        session: Optional[GenerationSession]
+    ) -> Generator[str, None, None]:
+        """
+        Saves a finished set (if db and user are provided) and yields its result event.
+        """
+        # 3. Save to DB
+        if db and user:
             try:
-                generation_config = llm.get_generation_config_json(llm.questions_schema)
-                
-                # Use streaming response
-                response = llm.model.generate_content(
-                    prompt,
-                    generation_config=generation_config,
-                    stream=True,
-                    use_web_search=use_web_search
+                set_id, question_ids = save_question_set(
+                    db,
+                    validated_questions,
+                    topic=topic,
+                    difficulty=difficulty,
+                    question_type=question_type,
+                    validation_text=validation_text,
+                    owner_id=user.id,
+                    session_id=session.id if session else None
                 )
+                for q_data, question_id in zip(validated_questions, question_ids):
+                    q_data["id"] = question_id
+                    q_data["set_id"] = set_id
+
+            except Exception as e:
+                logger.error(f"Error saving to DB: {e}")
+                yield f"data: {json.dumps({'type': 'error', 'message': 'Error saving results to database.', 'set_index': current_set})}\n\n"
+
+        # 4. Emit Result
+        yield f"data: {json.dumps({'type': 'result', 'set_index': current_set, 'data': validated_questions})}\n\n"
+
+    def generate_batch_stream(
+        self,
+        num_sets: int,
+        topic: str,
+        content: Optional[str] = None,
+        num_questions: int = 5,
+        difficulty: str = "medium",
+        question_type: str = "multiple_choice",
+        user_context: Optional[str] = None,
+        use_web_search: bool = False,
+        db: Session = None,
+        user: User = None,
+        session: GenerationSession = None,
+        concurrency: Optional[int] = None,
+        document: Optional[ExtractedDocument] = None
+    ) -> Generator[str, None, None]:
+        """
+        Generates multiple sets (question banks) of questions, yielding progress updates and results.
+        Yields JSON strings formatted as Server-Sent Events (SSE).
+        Saves results to DB if db and user are provided.
+        Updates session progress if session is provided.
+        Supports grounding with Google Search when use_web_search=True.
+
+        Up to `concurrency` sets (default GENERATION_CONCURRENCY) are generated at once.
+        Their events arrive interleaved, each tagged with its set_index, and every set is
+        saved as soon as it finishes. All database work stays on the calling thread.
+
+        When `content` is an uploaded document's text, pass the ExtractedDocument too so its
+        cached chunks and chunk embeddings are reused instead of recomputed.
+        """
+        if concurrency is None:
+            concurrency = GENERATION_CONCURRENCY
+        concurrency = max(1, min(concurrency, num_sets))
+
+        yield f"data: {json.dumps({'type': 'start', 'total_sets': num_sets})}\n\n"
+
+        # Every set's LLM calls share this user's slots in the concurrency limit
+        user_id = user.id if user else None
+
+        # Rank the content once; each set then gets its own slice within the token budget
+        plan = plan_content(content, topic, document=document)
+
+        def set_args(current_set: int) -> tuple:
+            set_content = plan.context_for_set(current_set - 1, num_sets) if plan else content
+            return (topic, set_content, num_questions, difficulty, question_type, user_context, use_web_search, user_id)
+
+        if concurrency == 1:
+            for i in range(num_sets):
+                current_set = i + 1
                 
-                full_text = ""
-                for chunk in response:
-                    if chunk.text:
-                        full_text += chunk.text
-                        # Stream the thinking text to frontend
-                        yield f"data: {json.dumps({'type': 'thinking', 'text': chunk.text, 'set_index': current_set})}\n\n"
-                
-                if not full_text:
-                    yield f"data: {json.dumps({'type': 'error', 'message': f'Failed to generate questions for set {current_set}'})}\n\n"
+                # Update session progress
+                if session and db:
+                    progress = int((i / num_sets) * 100)
+                    session.progress = progress
+                    session.current_step = f"Generating set {current_set}/{num_sets}"
+                    db.commit()
+
+                set_result = None
+                for event, result in self._stream_single_set(current_set, num_sets, *set_args(current_set)):
+                    if event:
+                        yield event
+                    if result is not None:
+                        set_result = result
+
+                if set_result is None:
                     continue
 
-                questions = json.loads(full_text)
-                
-                # Ensure we have exactly the requested number
-                if isinstance(questions, list):
-                    if len(questions) > num_questions:
-                        logger.warning(f"Set {current_set}: LLM returned {len(questions)} questions, truncating to {num_questions}")
-                        questions = questions[:num_questions]
-                    elif len(questions) < num_questions:
-                        logger.warning(f"Set {current_set}: LLM returned only {len(questions)} questions instead of {num_questions}")
-                
+                yield from self._save_set(
+                    current_set, set_result[0], set_result[1],
+                    topic, difficulty, question_type, db, user, session
+                )
+        else:
+            yield from self._generate_sets_concurrently(
+                num_sets, concurrency, set_args, topic, difficulty, question_type, db, user, session
+            )
+        
+        yield f"data: {json.dumps({'type': 'complete'})}\n\n"
+
+    def _generate_sets_concurrently(
+        self,
+        num_sets: int,
+        concurrency: int,
+        set_args: Callable[[int], tuple],
+        topic: str,
+        difficulty: str,
+        question_type: str,
+        db: Optional[Session],
+        user: Optional[User],
+        session: Optional[GenerationSession]
+    ) -> Generator[str, None, None]:
+        """
+        Runs _stream_single_set for every set on a bounded thread pool and relays
+        their events through a queue, saving each set on this thread when it finishes.
+        """
+        events: queue.Queue = queue.Queue()
+        cancelled = threading.Event()
+
+        def run_set(current_set: int):
+            try:
+                for event, result in self._stream_single_set(current_set, num_sets, *set_args(current_set)):
+                    if cancelled.is_set():
+                        return
+                    events.put((current_set, event, result))
             except Exception as e:
-                logger.error(f"Error generating questions: {e}")
-                yield f"data: {json.dumps({'type': 'error', 'message': f'Failed to generate questions for set {current_set}: {str(e)}'})}\n\n"
-                continue
-
-            # 2. Validate
-            yield f"data: {json.dumps({'type': 'progress', 'message': f'Validating set {current_set}/{num_sets}...', 'step': 'validating', 'set_index': current_set})}\n\n"
-
-            validated_questions = None
-            validation_text = ""
-            for chunk_text, result in self.validator.validate_question_batch_stream(
-                questions, topic, content if content else ""
-            ):
-                if chunk_text:
-                    # Stream validation thinking
-                    validation_text += chunk_text
-                    yield f"data: {json.dumps({'type': 'validating', 'text': chunk_text, 'set_index': current_set})}\n\n"
-                if result is not None:
-                    validated_questions = result
-
-            if validated_questions is None:
-                validated_questions = questions
-
-            # 3. Save to DB
-            if db and user:
-                try:
-                    db_set = QuestionSet(
-                        topic=topic,
-                        difficulty=difficulty,
-                        question_type=question_type,
-                        validation_text=validation_text,
-                        question_count=len(validated_questions),
-                        owner_id=user.id,
-                        session_id=session.id if session else None
+                logger.error(f"Error generating set {current_set}: {e}")
+                events.put((current_set, f"data: {json.dumps({'type': 'error', 'message': f'Failed to generate questions for set {current_set}: {str(e)}', 'set_index': current_set})}\n\n", None))
+            finally:
+                events.put((current_set, None, _SET_DONE))
+
+        if session and db:
+            session.progress = 0
+            session.current_step = f"Generating {num_sets} sets ({concurrency} at a time)"
+            db.commit()
+
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="qgen-set")
+        try:
+            for i in range(num_sets):
+                executor.submit(run_set, i + 1)
+
+            finished = 0
+            while finished < num_sets:
+                current_set, event, result = events.get()
+                if event:
+                    yield event
+                if result is _SET_DONE:
+                    finished += 1
+                    if session and db:
+                        session.progress = int((finished / num_sets) * 100)
+                        session.current_step = f"Finished {finished}/{num_sets} sets"
+                        db.commit()
+                elif result is not None:
+                    yield from self._save_set(
+                        current_set, result[0], result[1],
+                        topic, difficulty, question_type, db, user, session
                     )
-                    db.add(db_set)
-                    db.commit()
-                    db.refresh(db_set)
-
-                    db_questions = []
-                    for idx, q_data in enumerate(validated_questions):
-                        db_q = Question(
-                            description=q_data.get("description"),
-                            options=q_data.get("options", []),
-                            answer=q_data.get("answer"),
-                            explanation=q_data.get("explanation"),
-                            question_set_id=db_set.id,
-                            order_index=idx
-                        )
-                        db.add(db_q)
-                        db_questions.append(db_q)
-                    db.commit()
-                    
-                    # Refresh each question to get auto-generated IDs and add to response
-                    for idx, db_q in enumerate(db_questions):
-                        db.refresh(db_q)
-                        validated_questions[idx]["id"] = db_q.id
-                        validated_questions[idx]["set_id"] = db_set.id
-
-                except Exception as e:
-                    logger.error(f"Error saving to DB: {e}")
-                    yield f"data: {json.dumps({'type': 'error', 'message': 'Error saving results to database.'})}\n\n"
-
-            # 4. Emit Result
-            yield f"data: {json.dumps({'type': 'result', 'set_index': current_set, 'data': validated_questions})}\n\n"
-        
-        yield f"data: {json.dumps({'type': 'complete'})}\n\n"
\ No newline at end of file
+        finally:
+            # Stop outstanding sets early if the consumer went away
+            cancelled.set()
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,128 @@
+"""
+Generation history - question sets grouped by generation session and paged with a keyset
+cursor over each group's latest set (created_at, id). A page seeks to the cursor on the
+owner/created_at index and reads only its own groups' sets, so its cost depends on the page
+size, not on how long the history is. Sets without a session form a group of their own.
+"""
+
+import os
+import json
+import base64
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, exists, or_
+from sqlalchemy.orm import Session, aliased, noload, selectinload
+
+from backend.core import models
+from backend import schemas
+
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "20"))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "100"))
+
+
+def encode_cursor(created_at: datetime, last_id: int) -> str:
+    payload = json.dumps({"created_at": created_at.isoformat(), "id": last_id})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Raises ValueError for a cursor this module did not produce."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(payload["created_at"]), int(payload["id"])
+    except Exception:
+        raise ValueError("Invalid history cursor")
+
+
+def _is_latest_in_group():
+    """True for the set its group is listed under: the newest of its session, or a set without one."""
+    newer = aliased(models.QuestionSet)
+    return ~exists().where(
+        newer.session_id == models.QuestionSet.session_id,
+        or_(
+            newer.created_at > models.QuestionSet.created_at,
+            and_(newer.created_at == models.QuestionSet.created_at, newer.id > models.QuestionSet.id)
+        )
+    )
+
+
+def history_page(
+    db: Session,
+    owner_id: Optional[int] = None,
+    limit: int = HISTORY_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    summary: bool = False
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    One page of at most `limit` history groups, newest first, for `owner_id` (every user
+    when None), and the cursor of the next page (None on the last page). Each group carries
+    its sets; with `summary` the sets come without their questions. Three queries per page.
+    """
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+
+    # Walk sets newest first from the cursor and stop at the page's last group. Each group
+    # is listed under its latest set, so no set outside the page is aggregated.
+    page = db.query(
+        models.QuestionSet.id,
+        models.QuestionSet.session_id,
+        models.QuestionSet.created_at,
+        models.QuestionSet.topic,
+        models.QuestionSet.difficulty,
+        models.QuestionSet.question_type,
+        models.QuestionSet.owner_id,
+        models.User.email
+    ).outerjoin(models.User, models.User.id == models.QuestionSet.owner_id).filter(_is_latest_in_group())
+    if owner_id is not None:
+        page = page.filter(models.QuestionSet.owner_id == owner_id)
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        # The <= bound lets the index seek straight to the cursor
+        page = page.filter(models.QuestionSet.created_at <= cursor_created_at, or_(
+            models.QuestionSet.created_at < cursor_created_at,
+            models.QuestionSet.id < cursor_id
+        ))
+    rows = page.order_by(models.QuestionSet.created_at.desc(), models.QuestionSet.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    if not rows:
+        return [], None
+
+    session_ids = [row.session_id for row in rows if row.session_id is not None]
+    legacy_ids = [row.id for row in rows if row.session_id is None]
+    sets = db.query(models.QuestionSet).filter(or_(
+        models.QuestionSet.session_id.in_(session_ids),
+        models.QuestionSet.id.in_(legacy_ids)
+    ))
+    if owner_id is not None:
+        sets = sets.filter(models.QuestionSet.owner_id == owner_id)
+    loader = noload(models.QuestionSet.questions) if summary else selectinload(models.QuestionSet.questions)
+    sets = sets.options(loader).order_by(models.QuestionSet.created_at.desc(), models.QuestionSet.id.desc()).all()
+
+    sets_by_group = {}
+    for q_set in sets:
+        set_dict = schemas.QuestionSet.from_orm(q_set).dict(exclude={"questions"} if summary else None)
+        if not summary:
+            set_dict["questions"].sort(key=lambda q: (q["order_index"] or 0, q["id"]))
+        set_dict["question_type"] = q_set.question_type
+        sets_by_group.setdefault(q_set.session_id or -q_set.id, []).append(set_dict)
+
+    result = []
+    for row in rows:
+        group_sets = sets_by_group.get(row.session_id or -row.id, [])
+        result.append({
+            "session_id": row.session_id,
+            "topic": row.topic,
+            "difficulty": row.difficulty,
+            "question_type": row.question_type,
+            "created_at": row.created_at,
+            "total_questions": sum(s["question_count"] or 0 for s in group_sets),
+            "num_sets": len(group_sets),
+            "owner_id": row.owner_id,
+            "owner_email": row.email or "Unknown",
+            "question_sets": group_sets
+        })
+    return result, next_cursor
@@ -0,0 +1,100 @@
+"""
+Listing queries - load rows together with the users they reference (JOINed in the same
+query) and convert them to their *With{Owner,User,Users} schemas, so list endpoints cost
+one query per page instead of one more per row.
+"""
+
+from typing import Optional
+
+from sqlalchemy.orm import Query, Session, aliased, contains_eager, joinedload, noload, selectinload
+
+from backend.core import models
+from backend import schemas
+
+
+def _email(user: Optional[models.User]) -> str:
+    return user.email if user else "Unknown"
+
+
+def question_sets_with_owner(db: Session, with_questions: bool = False) -> Query:
+    """QuestionSets with `owner` loaded; questions are selectin-loaded only when asked for."""
+    query = db.query(models.QuestionSet).options(joinedload(models.QuestionSet.owner))
+    if with_questions:
+        return query.options(selectinload(models.QuestionSet.questions))
+    return query.options(noload(models.QuestionSet.questions))
+
+
+def sessions_with_user(db: Session) -> Query:
+    return db.query(models.GenerationSession).options(joinedload(models.GenerationSession.user))
+
+
+def tasks_with_users(db: Session) -> Query:
+    """Tasks with `assignee` and `created_by` loaded through two aliased outer joins."""
+    assignee = aliased(models.User)
+    creator = aliased(models.User)
+    return db.query(models.Task).outerjoin(assignee, models.Task.assignee).outerjoin(
+        creator, models.Task.created_by
+    ).options(
+        contains_eager(models.Task.assignee.of_type(assignee)),
+        contains_eager(models.Task.created_by.of_type(creator))
+    )
+
+
+def set_with_owner(q_set: models.QuestionSet) -> schemas.QuestionSetWithOwner:
+    return schemas.QuestionSetWithOwner(
+        id=q_set.id,
+        topic=q_set.topic,
+        difficulty=q_set.difficulty,
+        created_at=q_set.created_at,
+        updated_at=q_set.updated_at,
+        validation_text=q_set.validation_text,
+        question_count=q_set.question_count,
+        is_archived=q_set.is_archived,
+        session_id=q_set.session_id,
+        questions=q_set.questions,
+        owner_id=q_set.owner_id,
+        owner_email=_email(q_set.owner)
+    )
+
+
+def session_with_user(s: models.GenerationSession) -> schemas.SessionWithUser:
+    return schemas.SessionWithUser(
+        id=s.id,
+        session_id=s.session_id,
+        user_id=s.user_id,
+        topic=s.topic,
+        num_questions=s.num_questions,
+        num_sets=s.num_sets,
+        difficulty=s.difficulty,
+        question_type=s.question_type,
+        status=s.status,
+        progress=s.progress,
+        current_step=s.current_step,
+        error_message=s.error_message,
+        started_at=s.started_at,
+        completed_at=s.completed_at,
+        task_id=s.task_id,
+        user_email=_email(s.user)
+    )
+
+
+def task_with_users(t: models.Task) -> schemas.TaskWithUsers:
+    return schemas.TaskWithUsers(
+        id=t.id,
+        title=t.title,
+        description=t.description,
+        topic=t.topic,
+        num_questions=t.num_questions,
+        num_sets=t.num_sets,
+        difficulty=t.difficulty,
+        question_type=t.question_type,
+        user_context=t.user_context,
+        due_date=t.due_date,
+        status=t.status,
+        assignee_id=t.assignee_id,
+        created_by_id=t.created_by_id,
+        created_at=t.created_at,
+        completed_at=t.completed_at,
+        assignee_email=_email(t.assignee),
+        created_by_email=_email(t.created_by)
+    )
@@ -0,0 +1,92 @@
+"""
+Question set persistence - writes a generated set and all of its questions in one
+transaction, fetching the new IDs with INSERT ... RETURNING instead of a refresh per row.
+"""
+
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from backend.core.models import QuestionSet, Question
+from backend.services.counters import apply_deltas, question_set_deltas
+
+
+def _supports_bulk_returning(db: Session) -> bool:
+    """INSERT ... RETURNING, batched over many rows (SQLite >= 3.35, Postgres)."""
+    dialect = db.get_bind().dialect
+    return bool(getattr(dialect, "insert_returning", False) and getattr(dialect, "insert_executemany_returning", False))
+
+
+def _question_rows(questions: List[dict], set_id: int, now: datetime) -> List[dict]:
+    return [
+        {
+            "description": q.get("description"),
+            "options": q.get("options", []),
+            "answer": q.get("answer"),
+            "explanation": q.get("explanation"),
+            "question_set_id": set_id,
+            "order_index": idx,
+            "created_at": now,
+            "updated_at": now
+        }
+        for idx, q in enumerate(questions)
+    ]
+
+
+def save_question_set(
+    db: Session,
+    questions: List[dict],
+    topic: str,
+    difficulty: str,
+    question_type: str,
+    validation_text: str,
+    owner_id: int,
+    session_id: Optional[int] = None
+) -> Tuple[int, List[int]]:
+    """
+    Insert a question set and its questions and commit once. Returns the set ID and the
+    question IDs in the order of `questions`. Rolls back and re-raises on failure.
+    """
+    now = datetime.utcnow()
+    set_values = {
+        "topic": topic,
+        "difficulty": difficulty,
+        "question_type": question_type,
+        "validation_text": validation_text,
+        "question_count": len(questions),
+        "owner_id": owner_id,
+        "session_id": session_id,
+        "created_at": now,
+        "updated_at": now
+    }
+
+    try:
+        if _supports_bulk_returning(db):
+            set_id = db.execute(insert(QuestionSet).values(**set_values).returning(QuestionSet.id)).scalar_one()
+            question_ids = [None] * len(questions)
+            if questions:
+                # Rows may come back in any order; order_index is unique within the set
+                for question_id, order_index in db.execute(
+                    insert(Question).returning(Question.id, Question.order_index),
+                    _question_rows(questions, set_id, now)
+                ):
+                    question_ids[order_index] = question_id
+            # Core inserts skip the ORM flush events that keep the counters current
+            apply_deltas(db, question_set_deltas(owner_id, len(questions)))
+        else:
+            db_set = QuestionSet(**set_values)
+            db.add(db_set)
+            db.flush()
+            set_id = db_set.id
+            db_questions = [Question(**row) for row in _question_rows(questions, set_id, now)]
+            db.add_all(db_questions)
+            db.flush()
+            question_ids = [q.id for q in db_questions]
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return set_id, question_ids
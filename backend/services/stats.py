@@ -0,0 +1,87 @@
+"""
+Per-user statistics - one grouped aggregate per stat, outer-joined to users, so the
+admin user list costs a constant number of queries however many users there are.
+"""
+
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from backend.core import models
+from backend import schemas
+
+USER_STAT_COLUMNS = ("total_generations", "total_questions", "active_sessions", "pending_tasks")
+USER_SORT_COLUMNS = ("id", "email", "created_at", "is_active", "is_admin") + USER_STAT_COLUMNS
+
+
+def _user_stat_subqueries(db: Session) -> dict:
+    """name -> subquery with (owner, value) rows, one per user that has any."""
+    generations = db.query(
+        models.QuestionSet.owner_id.label("owner"),
+        func.count(models.QuestionSet.id).label("value")
+    ).group_by(models.QuestionSet.owner_id).subquery()
+
+    questions = db.query(
+        models.QuestionSet.owner_id.label("owner"),
+        func.count(models.Question.id).label("value")
+    ).join(models.Question, models.Question.question_set_id == models.QuestionSet.id).group_by(
+        models.QuestionSet.owner_id
+    ).subquery()
+
+    sessions = db.query(
+        models.GenerationSession.user_id.label("owner"),
+        func.count(models.GenerationSession.id).label("value")
+    ).filter(models.GenerationSession.status == "active").group_by(models.GenerationSession.user_id).subquery()
+
+    tasks = db.query(
+        models.Task.assignee_id.label("owner"),
+        func.count(models.Task.id).label("value")
+    ).filter(models.Task.status == "pending").group_by(models.Task.assignee_id).subquery()
+
+    return dict(zip(USER_STAT_COLUMNS, (generations, questions, sessions, tasks)))
+
+
+def users_with_stats(
+    db: Session,
+    skip: int = 0,
+    limit: Optional[int] = None,
+    sort_by: str = "id",
+    order: str = "asc"
+) -> Tuple[int, List[schemas.UserWithStats]]:
+    """
+    (total user count, one page of users with their stats), sorted by `sort_by` (any of
+    USER_SORT_COLUMNS) with the user id as tie-breaker. Two queries in all.
+    """
+    if sort_by not in USER_SORT_COLUMNS:
+        raise ValueError(f"Cannot sort by '{sort_by}'; use one of {', '.join(USER_SORT_COLUMNS)}")
+    if order not in ("asc", "desc"):
+        raise ValueError("order must be 'asc' or 'desc'")
+
+    subqueries = _user_stat_subqueries(db)
+    stats = {name: func.coalesce(sub.c.value, 0).label(name) for name, sub in subqueries.items()}
+
+    query = db.query(models.User, *stats.values())
+    for sub in subqueries.values():
+        query = query.outerjoin(sub, sub.c.owner == models.User.id)
+
+    sort_column = stats[sort_by] if sort_by in stats else getattr(models.User, sort_by)
+    sort_column = sort_column.desc() if order == "desc" else sort_column.asc()
+    tie_breaker = models.User.id.desc() if order == "desc" else models.User.id.asc()
+    query = query.order_by(sort_column, tie_breaker).offset(skip)
+    if limit is not None:
+        query = query.limit(limit)
+
+    total = db.query(func.count(models.User.id)).scalar()
+    rows = [
+        schemas.UserWithStats(
+            id=user.id,
+            email=user.email,
+            is_active=user.is_active,
+            is_admin=user.is_admin,
+            created_at=user.created_at,
+            **dict(zip(USER_STAT_COLUMNS, values))
+        )
+        for user, *values in query.all()
+    ]
+    return total, rows
@@ -0,0 +1,78 @@
+"""
+Upload handling - spools request files to disk in blocks, hashing as they stream,
+so a 50 MB PDF never has to sit in memory as one bytes object.
+"""
+
+import os
+import hashlib
+import logging
+import tempfile
+from typing import Optional
+
+from fastapi import HTTPException, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+MAX_FILE_SIZE_MB = int(os.getenv("MAX_FILE_SIZE_MB", "50"))
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None  # None = system temp dir
+
+_BLOCK_SIZE = 1 << 20
+
+
+class SpooledUpload:
+    """A request file copied to a temp path, with its sha256 and size. Use as a context manager."""
+
+    def __init__(self, path: str, digest: str, size: int, content_type: Optional[str]):
+        self.path = path
+        self.digest = digest
+        self.size = size
+        self.content_type = content_type or ""
+
+    def read_text(self) -> str:
+        with open(self.path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def close(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+async def spool_upload(file: UploadFile, max_size_mb: int = MAX_FILE_SIZE_MB) -> SpooledUpload:
+    """
+    Copy `file` to a temp file block by block, hashing as it streams.
+    Raises 413 as soon as the upload exceeds `max_size_mb`.
+    """
+    limit = max_size_mb * 1024 * 1024
+    digest = hashlib.sha256()
+    size = 0
+    spool = tempfile.NamedTemporaryFile(dir=UPLOAD_SPOOL_DIR, suffix=".upload", delete=False)
+
+    try:
+        with spool:
+            while True:
+                block = await file.read(_BLOCK_SIZE)
+                if not block:
+                    break
+                size += len(block)
+                if size > limit:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"File exceeds the {max_size_mb} MB upload limit"
+                    )
+                digest.update(block)
+                await run_in_threadpool(spool.write, block)
+    except BaseException:
+        os.unlink(spool.name)
+        raise
+
+    logger.info(f"Spooled upload {file.filename!r} ({size / 1024 / 1024:.1f} MB) to {spool.name}")
+    return SpooledUpload(spool.name, digest.hexdigest(), size, file.content_type)
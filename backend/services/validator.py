@@ -1,7 +1,7 @@
 import json
 import logging
 import backend.core.llm as llm
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
 from backend.core.local_ml import (
     batch_validate_locally,
     remove_duplicate_questions,
@@ -14,7 +14,7 @@ class QuestionValidator:
     def __init__(self):
         pass
 
-    def validate_question_batch_stream(self, questions: List[Dict[str, Any]], topic: str, content: str = "", skip_api: bool = False):
+    def validate_question_batch_stream(self, questions: List[Dict[str, Any]], topic: str, content: str = "", skip_api: bool = False, user_id: Optional[int] = None):
         """
         Validates a batch of questions with streaming support.
         Yields validation thinking chunks, then returns the final validated questions.
@@ -84,7 +84,8 @@ Format your validation as a detailed report, examining each question systematica
             # Get validation thinking (non-JSON, natural language)
             response = llm.model.generate_content(
                 validation_prompt,
-                stream=True
+                stream=True,
+                user_id=user_id
             )
 
             validation_thinking = ""
@@ -113,7 +114,8 @@ Return ONLY the corrected JSON array of questions.
             
             correction_response = llm.model.generate_content(
                 correction_prompt,
-                generation_config=generation_config
+                generation_config=generation_config,
+                user_id=user_id
             )
 
             if not correction_response.text:
@@ -134,7 +136,7 @@ Return ONLY the corrected JSON array of questions.
             logger.error(f"Error during validation: {e}")
             yield None, questions
 
-    def validate_question_batch(self, questions: List[Dict[str, Any]], topic: str, content: str = "") -> List[Dict[str, Any]]:
+    def validate_question_batch(self, questions: List[Dict[str, Any]], topic: str, content: str = "", user_id: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Validates a batch of questions for correctness and relevance.
         Returns the validated (and potentially fixed) questions.
@@ -180,7 +182,8 @@ Return ONLY the corrected JSON array of questions.
             
             response = llm.model.generate_content(
                 prompt,
-                generation_config=generation_config
+                generation_config=generation_config,
+                user_id=user_id
             )
 
             if not response.text:
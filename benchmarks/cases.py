@@ -0,0 +1,210 @@
+"""
+Benchmark cases. Each case has a setup(size, workdir) that builds its inputs and returns
+the operation to time plus how many items one call processes.
+Cases import the backend lazily: the harness configures the environment first.
+"""
+
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple
+
+
+class SkipCase(Exception):
+    """Raised by setup() when a case cannot run in this environment."""
+
+
+class CaseSetup(NamedTuple):
+    operation: Callable[[], Any]
+    items_per_call: int
+
+
+class Case(NamedTuple):
+    setup: Callable[[int, Path], CaseSetup]
+    sizes: List[int]
+    unit: str
+    default_iterations: Callable[[int], int]
+
+
+QUESTIONS_PER_SET = 10
+
+
+def _scaled_iterations(size: int) -> int:
+    return max(3, min(30, 3000 // max(size, 1)))
+
+
+def _create_user(email: str = "bench@example.com"):
+    from backend.core.database import SessionLocal, Base, engine
+    from backend.core import models
+    from backend.services import auth
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user = models.User(email=email, hashed_password=auth.get_password_hash("bench"))
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return db, user
+
+
+def _api_client(email: str):
+    try:
+        from fastapi.testclient import TestClient
+    except Exception as e:
+        raise SkipCase(f"fastapi TestClient unavailable ({e}); pip install httpx")
+    from backend.main import app
+    from backend.services import auth
+
+    token = auth.create_access_token(data={"sub": email})
+    client = TestClient(app)
+    client.headers.update({"Authorization": f"Bearer {token}"})
+    return client
+
+
+def _check(response):
+    if response.status_code != 200:
+        raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+    return response
+
+
+# ============ Generation pipeline ============
+
+def setup_generate_batch_stream(num_sets: int, workdir: Path) -> CaseSetup:
+    from backend.core import models
+    from backend.services.generator import QuestionGenerator
+
+    db, user = _create_user()
+    generator = QuestionGenerator()
+
+    def operation():
+        session = models.GenerationSession(
+            user_id=user.id, topic="Benchmark", num_questions=QUESTIONS_PER_SET,
+            num_sets=num_sets, difficulty="medium", question_type="multiple_choice", status="active"
+        )
+        db.add(session)
+        db.commit()
+        for _ in generator.generate_batch_stream(
+            num_sets=num_sets,
+            topic="Benchmark",
+            content="Synthetic benchmark content. " * 50,
+            num_questions=QUESTIONS_PER_SET,
+            db=db,
+            user=user,
+            session=session
+        ):
+            pass
+
+    return CaseSetup(operation, num_sets * QUESTIONS_PER_SET)
+
+
+def setup_validate_question_batch_stream(size: int, workdir: Path) -> CaseSetup:
+    from benchmarks.data import synthetic_questions
+    from backend.services.validator import QuestionValidator
+
+    validator = QuestionValidator()
+    questions = synthetic_questions(size)
+
+    def operation():
+        for _ in validator.validate_question_batch_stream(questions, "Benchmark", "Synthetic content"):
+            pass
+
+    return CaseSetup(operation, size)
+
+
+def setup_find_duplicates(size: int, workdir: Path) -> CaseSetup:
+    from benchmarks.data import synthetic_questions
+    from backend.core.local_ml import find_duplicates, is_local_ml_available
+
+    if not is_local_ml_available():
+        raise SkipCase("sentence-transformers model unavailable")
+    questions = synthetic_questions(size)
+
+    return CaseSetup(lambda: find_duplicates(questions), size)
+
+
+def setup_find_duplicate_pairs(size: int, workdir: Path) -> CaseSetup:
+    import numpy as np
+    from backend.core.local_ml import find_duplicate_pairs
+
+    # Random 384-d vectors (all-MiniLM-L6-v2 width); exercises the matrix engine without the model
+    embeddings = np.random.default_rng(0).normal(size=(size, 384)).astype(np.float32)
+
+    return CaseSetup(lambda: find_duplicate_pairs(embeddings), size)
+
+
+def setup_extract_text_from_pdf(pages: int, workdir: Path) -> CaseSetup:
+    from benchmarks.data import make_pdf
+    from backend.core.pdf_processor import extract_text_from_pdf
+
+    pdf_bytes = make_pdf(workdir / f"bench_{pages}.pdf", pages).read_bytes()
+
+    return CaseSetup(lambda: extract_text_from_pdf(pdf_bytes, parallel=False), pages)
+
+
+def setup_extract_text_from_pdf_parallel(pages: int, workdir: Path) -> CaseSetup:
+    from benchmarks.data import make_pdf
+    from backend.core.pdf_processor import extract_text_from_pdf
+
+    pdf_path = make_pdf(workdir / f"bench_{pages}.pdf", pages)
+    # Warm the worker pool so process start-up isn't timed
+    extract_text_from_pdf(pdf_path, parallel=True)
+
+    return CaseSetup(lambda: extract_text_from_pdf(pdf_path, parallel=True), pages)
+
+
+# ============ History endpoints ============
+
+def _seeded_history_client(n_questions: int):
+    from benchmarks.data import seed_question_sets
+
+    db, user = _create_user()
+    set_ids = seed_question_sets(db, user.id, n_questions, questions_per_set=QUESTIONS_PER_SET)
+    client = _api_client(user.email)
+    return db, user, set_ids, client
+
+
+def setup_history(n_questions: int, workdir: Path) -> CaseSetup:
+    _, _, _, client = _seeded_history_client(n_questions)
+    return CaseSetup(lambda: _check(client.get("/history")), n_questions)
+
+
+def setup_history_session(n_questions: int, workdir: Path) -> CaseSetup:
+    from backend.core import models
+
+    db, _, set_ids, client = _seeded_history_client(n_questions)
+    session_id = db.query(models.QuestionSet.session_id).filter(models.QuestionSet.id == set_ids[-1]).scalar()
+    return CaseSetup(lambda: _check(client.get(f"/history/session/{session_id}")), 1)
+
+
+def setup_history_set(n_questions: int, workdir: Path) -> CaseSetup:
+    _, _, set_ids, client = _seeded_history_client(n_questions)
+    return CaseSetup(lambda: _check(client.get(f"/history/{set_ids[-1]}")), 1)
+
+
+# ============ Exports ============
+
+def _make_export_case(fmt: str) -> Callable[[int, Path], CaseSetup]:
+    def setup(set_size: int, workdir: Path) -> CaseSetup:
+        from benchmarks.data import seed_question_sets
+
+        db, user = _create_user()
+        set_ids = seed_question_sets(db, user.id, set_size, questions_per_set=set_size)
+        client = _api_client(user.email)
+        return CaseSetup(lambda: _check(client.get(f"/export/{set_ids[0]}", params={"format": fmt})), set_size)
+
+    return setup
+
+
+CASES: Dict[str, Case] = {
+    "generate_batch_stream": Case(setup_generate_batch_stream, [1, 5, 20], "sets", lambda size: 5),
+    "validate_question_batch_stream": Case(setup_validate_question_batch_stream, [10, 100, 1000], "questions", _scaled_iterations),
+    "find_duplicates": Case(setup_find_duplicates, [10, 1000, 10000], "questions", lambda size: 3 if size > 1000 else 10),
+    "find_duplicate_pairs": Case(setup_find_duplicate_pairs, [10, 1000, 10000], "embeddings", lambda size: 3 if size > 1000 else 10),
+    "extract_text_from_pdf": Case(setup_extract_text_from_pdf, [1, 50, 500], "pages", lambda size: max(3, min(20, 500 // size))),
+    "extract_text_from_pdf_parallel": Case(setup_extract_text_from_pdf_parallel, [50, 500], "pages", lambda size: max(3, min(20, 500 // size))),
+    "history": Case(setup_history, [10, 1000, 100000], "stored questions", _scaled_iterations),
+    "history_session": Case(setup_history_session, [10, 1000, 100000], "stored questions", lambda size: 20),
+    "history_set": Case(setup_history_set, [10, 1000, 100000], "stored questions", lambda size: 20),
+    "export_json": Case(_make_export_case("json"), [10, 1000, 10000], "questions in set", _scaled_iterations),
+    "export_csv": Case(_make_export_case("csv"), [10, 1000, 10000], "questions in set", _scaled_iterations),
+    "export_txt": Case(_make_export_case("txt"), [10, 1000, 10000], "questions in set", _scaled_iterations),
+    "export_pdf": Case(_make_export_case("pdf"), [10, 1000, 10000], "questions in set", lambda size: 3),
+}
@@ -0,0 +1,123 @@
+"""
+Synthetic data for benchmarks - questions, PDFs and pre-populated databases.
+Everything is generated from a seed so runs on different commits see identical inputs.
+"""
+
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List
+
+_WORDS = (
+    "atom cell energy force mass light wave heat field charge orbit gene enzyme protein "
+    "membrane tissue organ climate erosion mineral rock fossil market price demand supply "
+    "contract theorem proof vector matrix integral limit series graph network signal"
+).split()
+
+
+def _sentence(rng: random.Random, n_words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(n_words)).capitalize()
+
+
+def synthetic_questions(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Question dicts shaped like LLM output (description/options/answer/explanation)."""
+    rng = random.Random(seed)
+    questions = []
+    for i in range(n):
+        options = [_sentence(rng, 3) for _ in range(4)]
+        questions.append({
+            "description": f"Q{i}: {_sentence(rng, 14)}?",
+            "options": options,
+            "answer": rng.choice(options),
+            "explanation": _sentence(rng, 20) + "."
+        })
+    return questions
+
+
+def make_pdf(path: Path, pages: int, seed: int = 0) -> Path:
+    """Write a text-only PDF with a few paragraphs per page."""
+    import fitz  # PyMuPDF
+
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_no in range(pages):
+        page = doc.new_page()
+        paragraphs = [f"Chapter {page_no + 1}"] + [_sentence(rng, 60) + "." for _ in range(6)]
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), "\n\n".join(paragraphs), fontsize=9)
+    doc.save(str(path))
+    doc.close()
+    return path
+
+
+def seed_question_sets(db, owner_id: int, n_questions: int, questions_per_set: int = 10, sets_per_session: int = 5, seed: int = 0) -> List[int]:
+    """
+    Insert `n_questions` questions for one owner, grouped into sets and generation sessions.
+    Uses Core executemany inserts so seeding 100k rows takes seconds. Returns the set ids.
+    """
+    from sqlalchemy import insert
+    from backend.core import models
+
+    rng = random.Random(seed)
+    n_sets = max(1, -(-n_questions // questions_per_set))
+    base_time = datetime.utcnow() - timedelta(days=30)
+
+    n_sessions = -(-n_sets // sets_per_session)
+    db.execute(insert(models.GenerationSession), [
+        {
+            "session_id": f"bench-{owner_id}-{i}",
+            "user_id": owner_id,
+            "topic": f"Topic {i}",
+            "num_questions": questions_per_set,
+            "num_sets": sets_per_session,
+            "difficulty": "medium",
+            "question_type": "multiple_choice",
+            "status": "completed",
+            "progress": 100,
+            "started_at": base_time + timedelta(minutes=i)
+        }
+        for i in range(n_sessions)
+    ])
+    session_ids = [
+        row[0] for row in db.query(models.GenerationSession.id)
+        .filter(models.GenerationSession.user_id == owner_id)
+        .order_by(models.GenerationSession.id)
+    ]
+
+    set_rows = []
+    remaining = n_questions
+    for i in range(n_sets):
+        count = min(questions_per_set, remaining)
+        remaining -= count
+        set_rows.append({
+            "topic": f"Topic {i // sets_per_session}",
+            "difficulty": "medium",
+            "question_type": "multiple_choice",
+            "validation_text": _sentence(rng, 40),
+            "question_count": count,
+            "owner_id": owner_id,
+            "session_id": session_ids[i // sets_per_session],
+            "created_at": base_time + timedelta(minutes=i // sets_per_session, seconds=i % sets_per_session)
+        })
+    db.execute(insert(models.QuestionSet), set_rows)
+    set_ids = [
+        row[0] for row in db.query(models.QuestionSet.id)
+        .filter(models.QuestionSet.owner_id == owner_id)
+        .order_by(models.QuestionSet.id)
+    ]
+
+    questions = synthetic_questions(n_questions, seed)
+    batch = []
+    for idx, q in enumerate(questions):
+        batch.append({
+            **q,
+            "question_set_id": set_ids[idx // questions_per_set],
+            "order_index": idx % questions_per_set
+        })
+        if len(batch) >= 5000:
+            db.execute(insert(models.Question), batch)
+            batch = []
+    if batch:
+        db.execute(insert(models.Question), batch)
+
+    db.commit()
+    return set_ids
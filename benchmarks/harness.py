@@ -0,0 +1,94 @@
+"""
+Benchmark harness - timing, percentiles and memory measurement.
+Each case runs in a fresh spawned interpreter so peak RSS belongs to that case alone.
+"""
+
+import os
+import sys
+import time
+import resource
+import tempfile
+import traceback
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def peak_rss_kb() -> int:
+    """Peak resident set size of this process in KiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports KiB
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def measure(operation: Callable[[], Any], items_per_call: int, iterations: int, warmup: int = 1) -> Dict[str, Any]:
+    """Time `operation` and summarise latency (ms) and throughput (items/s)."""
+    for _ in range(warmup):
+        operation()
+
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    total = sum(timings)
+    return {
+        "iterations": iterations,
+        "items_per_call": items_per_call,
+        "mean_ms": total / iterations * 1000,
+        "p50_ms": percentile(timings, 50) * 1000,
+        "p95_ms": percentile(timings, 95) * 1000,
+        "p99_ms": percentile(timings, 99) * 1000,
+        "max_ms": timings[-1] * 1000,
+        "throughput_per_s": (items_per_call * iterations) / total if total > 0 else 0.0,
+        "peak_rss_kb": peak_rss_kb()
+    }
+
+
+def _prepare_environment(workdir: Path, env: Dict[str, str]):
+    """Point the backend at a throwaway database and the fake LLM before it is imported."""
+    os.chdir(workdir)
+    os.environ.update(env)
+    os.environ.pop("GEMINI_API_KEY", None)
+    if str(ROOT_DIR) not in sys.path:
+        sys.path.insert(0, str(ROOT_DIR))
+
+
+def _run_case_in_child(case_name: str, size: int, iterations: Optional[int], workdir: str, env: Dict[str, str]) -> Dict[str, Any]:
+    _prepare_environment(Path(workdir), env)
+
+    from benchmarks import cases
+
+    bench = cases.CASES[case_name]
+    try:
+        setup = bench.setup(size, Path(workdir))
+    except cases.SkipCase as e:
+        return {"skipped": str(e)}
+
+    n_iterations = iterations or bench.default_iterations(size)
+    return measure(setup.operation, setup.items_per_call, n_iterations)
+
+
+def run_case(case_name: str, size: int, iterations: Optional[int], env: Dict[str, str]) -> Dict[str, Any]:
+    """Run one case/size pair in an isolated process and return its measurements."""
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory(prefix=f"qgen-bench-{case_name}-") as workdir:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            future = pool.submit(_run_case_in_child, case_name, size, iterations, workdir, env)
+            try:
+                return future.result()
+            except Exception as e:
+                return {"error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()}
@@ -0,0 +1,116 @@
+"""
+Benchmark runner.
+
+    python -m benchmarks.run                              # every case at its default sizes
+    python -m benchmarks.run --cases history,export_csv --sizes 10,1000
+    python -m benchmarks.run --output bench.json --compare baseline.json
+
+Results are written as JSON (one record per case/size) together with the git commit,
+so runs on different commits can be diffed with --compare.
+"""
+
+import os
+import sys
+import json
+import platform
+import argparse
+import subprocess
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from benchmarks.harness import ROOT_DIR, run_case
+from benchmarks.cases import CASES
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def _format_row(record: Dict[str, Any]) -> str:
+    label = f"{record['case']} [{record['size']} {record['unit']}]"
+    if "skipped" in record:
+        return f"{label:<60} skipped: {record['skipped']}"
+    if "error" in record:
+        return f"{label:<60} ERROR: {record['error']}"
+    return (
+        f"{label:<60} p50 {record['p50_ms']:>10.2f} ms  p95 {record['p95_ms']:>10.2f} ms  "
+        f"p99 {record['p99_ms']:>10.2f} ms  {record['throughput_per_s']:>12.1f} /s  "
+        f"rss {record['peak_rss_kb'] / 1024:>8.1f} MiB"
+    )
+
+
+def _compare(results: List[Dict[str, Any]], baseline_path: Path):
+    baseline = json.loads(baseline_path.read_text())
+    previous = {(r["case"], r["size"]): r for r in baseline.get("results", []) if "p50_ms" in r}
+
+    print(f"\nComparison against {baseline_path} ({baseline.get('meta', {}).get('git_commit')}):")
+    for record in results:
+        before = previous.get((record["case"], record["size"]))
+        if before is None or "p50_ms" not in record:
+            continue
+        p50_delta = (record["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100 if before["p50_ms"] else 0.0
+        rss_delta = (record["peak_rss_kb"] - before["peak_rss_kb"]) / before["peak_rss_kb"] * 100 if before["peak_rss_kb"] else 0.0
+        print(f"  {record['case']} [{record['size']}]: p50 {p50_delta:+.1f}%  peak RSS {rss_delta:+.1f}%")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the question generation pipeline")
+    parser.add_argument("--cases", help=f"Comma-separated cases (default: all). Available: {', '.join(CASES)}")
+    parser.add_argument("--sizes", help="Comma-separated sizes overriding each case's defaults")
+    parser.add_argument("--iterations", type=int, help="Timed iterations per case/size (default: per case)")
+    parser.add_argument("--output", default="benchmark-results.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Previous results JSON to compare against")
+    parser.add_argument("--llm-latency-ms", default="0", help="FAKE_LLM_LATENCY_MS for generation cases")
+    parser.add_argument("--llm-tokens-per-sec", default="0", help="FAKE_LLM_TOKENS_PER_SEC for generation cases")
+    args = parser.parse_args(argv)
+
+    selected = args.cases.split(",") if args.cases else list(CASES)
+    unknown = [name for name in selected if name not in CASES]
+    if unknown:
+        parser.error(f"Unknown cases: {', '.join(unknown)}")
+
+    sizes_override = [int(s) for s in args.sizes.split(",")] if args.sizes else None
+
+    env = {
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_LATENCY_MS": args.llm_latency_ms,
+        "FAKE_LLM_TOKENS_PER_SEC": args.llm_tokens_per_sec,
+        "DATABASE_TYPE": "sqlite",
+        "DATABASE_URL": "sqlite:///./bench.db"
+    }
+
+    results = []
+    for name in selected:
+        case = CASES[name]
+        for size in sizes_override or case.sizes:
+            record = {"case": name, "size": size, "unit": case.unit}
+            record.update(run_case(name, size, args.iterations, env))
+            results.append(record)
+            print(_format_row(record), flush=True)
+
+    output = {
+        "meta": {
+            "git_commit": _git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "env": env
+        },
+        "results": results
+    }
+    Path(args.output).write_text(json.dumps(output, indent=2))
+    print(f"\nWrote {len(results)} results to {args.output}")
+
+    if args.compare:
+        _compare(results, Path(args.compare))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import hashlib
+
+import numpy as np
+
+from backend.core import local_ml, question_cache
+from backend.core.question_cache import QuestionCache
+from backend.core.vector_index import QuestionIndex
+
+
+def _questions(key):
+    return [{"description": f"question for {key}"}]
+
+
+def _fake_encode(texts):
+    seeds = [int(hashlib.sha256(text.encode()).hexdigest()[:8], 16) for text in texts]
+    return np.stack([np.random.default_rng(seed).normal(size=8) for seed in seeds]).astype(np.float32)
+
+
+def _small_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(question_cache, "_REMOVAL_LOG_SIZE", 3)
+    return QuestionCache(path=str(tmp_path / "questions.db"), max_entries=2)
+
+
+def test_removals_since_zero_reports_trimmed_log(tmp_path, monkeypatch):
+    cache = _small_cache(tmp_path, monkeypatch)
+    assert cache.removals_since(0) == ([], 0, True)
+
+    for i in range(12):
+        cache.put(f"k{i}", _questions(f"k{i}"))
+
+    removed, latest, complete = cache.removals_since(0)
+    assert removed == ["k7", "k8", "k9"]
+    assert latest == 10
+    assert not complete
+
+
+def test_sync_rebuilds_index_after_log_trimmed_past_first_sync(tmp_path, monkeypatch):
+    cache = _small_cache(tmp_path, monkeypatch)
+    monkeypatch.setattr(local_ml, "_get_question_cache", lambda: cache)
+    monkeypatch.setattr(local_ml, "encode_texts", _fake_encode)
+    monkeypatch.setattr(local_ml, "_question_index", QuestionIndex())
+    monkeypatch.setattr(local_ml, "_indexed_entries", {})
+    monkeypatch.setattr(local_ml, "_indexed_seq", 0)
+    monkeypatch.setattr(local_ml, "_indexed_removal_seq", 0)
+
+    # First sync sees entries but an empty removal log
+    cache.put("k0", _questions("k0"))
+    cache.put("k1", _questions("k1"))
+    local_ml._sync_question_index()
+    assert set(local_ml._indexed_entries) == {"k0", "k1"}
+
+    # k0..k9 are evicted, but the log only keeps the last three removals
+    for i in range(2, 12):
+        cache.put(f"k{i}", _questions(f"k{i}"))
+    local_ml._sync_question_index()
+
+    assert set(local_ml._indexed_entries) == {"k10", "k11"}
+    assert len(local_ml._question_index) == 2